@@ -9,17 +9,24 @@ FOLDER_ID = "1pIBpjP0aCY-R9Zs7NUgyHwnw2lSTy1ya"
 
 # Application Default Credentialsを使用
 creds, project = default(scopes=['https://www.googleapis.com/auth/drive.readonly'])
-drive = build('drive', 'v3', credentials=creds)
+drive = build('drive', 'v3', credentials=creds, static_discovery=True, cache_discovery=False)
 
-# フォルダ内の全ファイルを取得
+# フォルダ内の全ファイルを取得（100件を超える場合もページングで全件）
 query = f"'{FOLDER_ID}' in parents and trashed=false"
-results = drive.files().list(
-    q=query,
-    fields='files(id, name, mimeType)',
-    pageSize=100
-).execute()
-
-files = results.get('files', [])
+files = []
+page_token = None
+while True:
+    results = drive.files().list(
+        q=query,
+        fields='nextPageToken, files(id, name, mimeType)',
+        pageSize=1000,
+        orderBy='name',
+        pageToken=page_token
+    ).execute()
+    files.extend(results.get('files', []))
+    page_token = results.get('nextPageToken')
+    if not page_token:
+        break
 
 print(f"フォルダ内のファイル数: {len(files)}")
 print()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""メンテナンス用スクリプト共通のシークレット取得・APIサービス生成"""
+
+import functools
+from google.cloud import secretmanager
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+PROJECT_ID = "project-3255e657-b52f-4d63-ae7"
+
+SCOPES = [
+    "https://www.googleapis.com/auth/gmail.modify",
+    "https://www.googleapis.com/auth/gmail.labels",
+    "https://www.googleapis.com/auth/drive",
+]
+
+@functools.lru_cache(maxsize=None)
+def _get_secret_client():
+    return secretmanager.SecretManagerServiceClient()
+
+@functools.lru_cache(maxsize=None)
+def get_secret(secret_name):
+    """Secret Managerからシークレット取得"""
+    name = f"projects/{PROJECT_ID}/secrets/{secret_name}/versions/latest"
+    response = _get_secret_client().access_secret_version(request={"name": name})
+    return response.payload.data.decode('UTF-8')
+
+@functools.lru_cache(maxsize=None)
+def get_credentials():
+    """OAuth認証情報を取得（Gmail/Driveで同じオブジェクトを共有）"""
+    return Credentials(
+        token=None,
+        refresh_token=get_secret("GMAIL_REFRESH_TOKEN"),
+        token_uri="https://oauth2.googleapis.com/token",
+        client_id=get_secret("GMAIL_CLIENT_ID"),
+        client_secret=get_secret("GMAIL_CLIENT_SECRET"),
+        scopes=SCOPES
+    )
+
+@functools.lru_cache(maxsize=None)
+def gmail_service():
+    """Gmail APIサービスを取得"""
+    return build('gmail', 'v1', credentials=get_credentials(), static_discovery=True, cache_discovery=False)
+
+@functools.lru_cache(maxsize=None)
+def drive_service():
+    """Drive APIサービスを取得"""
+    return build('drive', 'v3', credentials=get_credentials(), static_discovery=True, cache_discovery=False)
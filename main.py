@@ -5,35 +5,129 @@ Gmailから販売図面・住宅地図メールを取得し、Google Driveに自
 
 import os
 import re
+import base64
+import hashlib
+import json
+import functools
+import mimetypes
 import threading
 import time
+import traceback
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify
 from google.cloud import secretmanager
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request as AuthRequest
+import google_auth_httplib2
+import httplib2
 from googleapiclient.discovery import build
+from googleapiclient.http import MediaInMemoryUpload
 from datetime import datetime, timedelta
 from typing import Optional
 import io
-from pypdf import PdfReader
-import google.generativeai as genai
-import googlemaps
 from simulation import run_simulation, create_simulation_excel, format_simulation_summary_for_report
 
+# 同期Flaskのまま、I/O待ちはgunicornのgthreadワーカー（16スレッド）とCloud Runの同時実行数16で並行させる
+# （Google APIクライアント・Geminiクライアントが同期APIのため、Quart/FastAPIへの非同期化はしない）
 app = Flask(__name__)
 
-# Secret Manager クライアント
-secret_client = secretmanager.SecretManagerServiceClient()
 PROJECT_ID = os.environ.get('GCP_PROJECT_ID')
 
+def _client_singleton(factory):
+    """クライアント生成関数の結果を引数毎に使い回す（lru_cacheと同じくcache_clearで破棄できる）
+
+    lru_cacheは同時に初回呼び出しされると複数スレッドが生成を重複実行するため、
+    生成はロックで1回に限定する（並列ワーカー起動直後のSecret Managerクライアント・チャネル生成、
+    シークレット取得・genai.configureの重複を防ぐ）
+    """
+    cache = {}
+    lock = threading.Lock()
+
+    @functools.wraps(factory)
+    def wrapper(*args):
+        try:
+            return cache[args]
+        except KeyError:
+            pass
+        with lock:
+            if args not in cache:
+                cache[args] = factory(*args)
+            return cache[args]
+
+    def cache_clear():
+        with lock:
+            cache.clear()
+
+    wrapper.cache_clear = cache_clear
+    return wrapper
+
+@_client_singleton
+def _get_secret_client():
+    """Secret Manager クライアント（gRPCチャネル生成が重いため初回使用時に作成）"""
+    return secretmanager.SecretManagerServiceClient()
+
+# シークレットのキャッシュ（ローテーションに追随できるようTTL付き）
+# TTL切れの値はそのまま返しつつバックグラウンドで再取得する（stale-while-revalidate）
+SECRET_CACHE_TTL = int(os.environ.get('SECRET_CACHE_TTL', '3600'))
+_secret_cache_lock = threading.Lock()
+_secret_cache = {}           # secret_name -> (value, fetched_at)
+_secret_refreshing = set()   # バックグラウンド再取得中のsecret_name
+
+def _fetch_secret(secret_name):
+    """Secret Managerから取得してキャッシュに保存"""
+    name = f"projects/{PROJECT_ID}/secrets/{secret_name}/versions/latest"
+    response = _get_secret_client().access_secret_version(request={"name": name})
+    val = response.payload.data.decode("UTF-8")
+    with _secret_cache_lock:
+        _secret_cache[secret_name] = (val, time.time())
+    return val
+
+def _refresh_secret(secret_name):
+    """バックグラウンドでシークレットを再取得（失敗時は古い値を使い続ける）"""
+    try:
+        _fetch_secret(secret_name)
+    except Exception as e:
+        print(f"シークレット再取得エラー（キャッシュを継続使用）: {secret_name}: {e}")
+    finally:
+        with _secret_cache_lock:
+            _secret_refreshing.discard(secret_name)
+
 def _read_secret(secret_name):
-    """環境変数から読み取り、なければSecret Manager APIにフォールバック"""
+    """環境変数から読み取り、なければSecret Manager APIにフォールバック（インスタンス内でTTLキャッシュ）"""
     val = os.environ.get(secret_name)
     if val:
         return val
-    name = f"projects/{PROJECT_ID}/secrets/{secret_name}/versions/latest"
-    response = secret_client.access_secret_version(request={"name": name})
-    return response.payload.data.decode("UTF-8")
+
+    with _secret_cache_lock:
+        entry = _secret_cache.get(secret_name)
+        if entry:
+            if time.time() - entry[1] >= SECRET_CACHE_TTL and secret_name not in _secret_refreshing:
+                _secret_refreshing.add(secret_name)
+                threading.Thread(target=_refresh_secret, args=(secret_name,), daemon=True).start()
+            return entry[0]
+
+    return _fetch_secret(secret_name)
+
+def clear_secret_cache():
+    """シークレットとそれを使うクライアントのキャッシュを破棄"""
+    with _secret_cache_lock:
+        _secret_cache.clear()
+    get_gmaps_client.cache_clear()
+    get_gemini_client.cache_clear()
+    get_perplexity_client.cache_clear()
+
+def _read_secrets(secret_names):
+    """複数シークレットを並列に取得（Secret Managerにバッチ取得APIがないため）
+
+    環境変数・キャッシュにあるものはそのまま返し、スレッドはAPI取得が必要な分だけ使う
+    """
+    with _secret_cache_lock:
+        missing = [name for name in secret_names if not os.environ.get(name) and name not in _secret_cache]
+    if len(missing) > 1:
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            list(executor.map(_fetch_secret, missing))
+    return {name: _read_secret(name) for name in secret_names}
 
 # ============================================================
 # OAuth Credential Cache（スレッドセーフ）
@@ -61,12 +155,13 @@ def get_credentials() -> Credentials:
 
         # 初回 or キャッシュ無効時: Credentialsオブジェクトを作成
         if _cached_creds is None:
+            secrets = _read_secrets(["GMAIL_REFRESH_TOKEN", "GMAIL_CLIENT_ID", "GMAIL_CLIENT_SECRET"])
             _cached_creds = Credentials(
                 token=None,
-                refresh_token=_read_secret("GMAIL_REFRESH_TOKEN"),
+                refresh_token=secrets["GMAIL_REFRESH_TOKEN"],
                 token_uri="https://oauth2.googleapis.com/token",
-                client_id=_read_secret("GMAIL_CLIENT_ID"),
-                client_secret=_read_secret("GMAIL_CLIENT_SECRET"),
+                client_id=secrets["GMAIL_CLIENT_ID"],
+                client_secret=secrets["GMAIL_CLIENT_SECRET"],
                 scopes=ALL_SCOPES,
             )
 
@@ -93,34 +188,85 @@ def invalidate_credentials():
     with _creds_lock:
         _cached_creds = None
         _cached_creds_expiry = 0
+        # Secret Managerで更新されたrefresh tokenを再取得させる
+        clear_secret_cache()
         print("Credentials cache invalidated")
 
+# ============================================================
+# API Service Cache（スレッド毎）
+# googleapiclientのhttpオブジェクトはスレッドセーフでないため、
+# スレッド単位でbuild済みサービスを再利用する
+# ============================================================
+_service_local = threading.local()
+API_HTTP_TIMEOUT = 30
+
+def _get_cached_service(service_name, version):
+    """スレッド毎にキャッシュしたAPIサービスを返す。Credentialsが差し替わったら再build。"""
+    creds = get_credentials()
+    services = getattr(_service_local, 'services', None)
+    if services is None:
+        services = _service_local.services = {}
+
+    cached = services.get((service_name, version))
+    if cached and cached[0] is creds:
+        return cached[1]
+
+    # keep-aliveの接続をスレッド内で使い回すため、httpオブジェクトをサービスと一緒に保持
+    authed_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=API_HTTP_TIMEOUT))
+    service = build(service_name, version, http=authed_http, static_discovery=True, cache_discovery=False)
+    services[(service_name, version)] = (creds, service)
+    return service
+
+def _get_http_session():
+    """googleapiclient以外のHTTP取得（Static Maps等）用のrequests.Sessionをスレッド毎に返す（keep-alive再利用）"""
+    session = getattr(_service_local, 'http_session', None)
+    if session is None:
+        import requests
+        session = _service_local.http_session = requests.Session()
+    return session
+
 def get_gmail_service():
-    """Gmail APIサービスを取得（cached credentials）"""
-    return build('gmail', 'v1', credentials=get_credentials())
+    """Gmail APIサービスを取得（cached credentials / service）"""
+    return _get_cached_service('gmail', 'v1')
 
 def get_drive_service():
-    """Drive APIサービスを取得（cached credentials）"""
-    return build('drive', 'v3', credentials=get_credentials())
+    """Drive APIサービスを取得（cached credentials / service）"""
+    return _get_cached_service('drive', 'v3')
 
 def get_docs_service():
-    """Docs APIサービスを取得（cached credentials）"""
-    return build('docs', 'v1', credentials=get_credentials())
+    """Docs APIサービスを取得（cached credentials / service）"""
+    return _get_cached_service('docs', 'v1')
 
+@_client_singleton
 def get_gmaps_client():
-    """Google Maps APIクライアントを取得"""
+    """Google Maps APIクライアントを取得（インスタンス内で使い回す）"""
+    # 重いモジュールは使う時に読み込む（/healthだけのコールドスタートを軽くする）
+    import googlemaps
     api_key = _read_secret("GOOGLE_MAPS_API_KEY")
     return googlemaps.Client(key=api_key)
 
-def get_gemini_client():
-    """Gemini APIクライアントを取得"""
+# get_gemini_client で生成したモデル -> 生成時のシステム指示（応答キャッシュのキーに使う）
+# id()の再利用で別モデルと取り違えないよう、モデル自体も保持して同一性を確認する
+_gemini_system_instructions = {}
+
+@_client_singleton
+def get_gemini_client(system_instruction=None):
+    """Gemini APIクライアントを取得（genai.configureは初回のみ）
+
+    system_instruction を指定すると、固定の指示をシステム指示として持つモデルを返す
+    （呼び出し毎に送る内容が可変部分だけになり、共通の先頭部分は暗黙キャッシュの対象になる）
+    """
+    import google.generativeai as genai
     api_key = _read_secret("GEMINI_API_KEY")
     genai.configure(api_key=api_key)
     # Gemini 2.5 Flash (2026年現在の推奨モデル、1.5は廃止済み)
-    return genai.GenerativeModel('gemini-2.5-flash')
+    model = genai.GenerativeModel('gemini-2.5-flash', system_instruction=system_instruction)
+    _gemini_system_instructions[id(model)] = (model, system_instruction)
+    return model
 
+@_client_singleton
 def get_perplexity_client():
-    """Perplexity APIクライアントを取得（OpenAI互換）"""
+    """Perplexity APIクライアントを取得（OpenAI互換、インスタンス内で使い回す）"""
     try:
         # PERPLEXITY_API_KEYはオプション（なければフリー層で動作）
         try:
@@ -141,26 +287,116 @@ def get_perplexity_client():
         print(f"Perplexity クライアント初期化エラー: {e}")
         return None
 
-def extract_text_from_pdf(file_data: bytes) -> str:
-    """PDFバイナリデータからテキストを抽出"""
+# ============================================================
+# Gemini応答キャッシュ（同じ入力の再処理でLLMを呼び直さない）
+# ============================================================
+LLM_CACHE_TTL = 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 256
+_llm_cache_lock = threading.Lock()
+_llm_cache = {}  # sha256(モデル名 + 入力 + オプション) -> (応答テキスト, cached_at)
+
+def _llm_cache_key(model_name, contents, kwargs):
+    """モデル名・プロンプト・画像バイト列・オプションからキャッシュキーを作る"""
+    h = hashlib.sha256(model_name.encode('utf-8'))
+    for part in contents if isinstance(contents, list) else [contents]:
+        if isinstance(part, str):
+            h.update(part.encode('utf-8'))
+        elif isinstance(part, dict):
+            h.update(part.get('mime_type', '').encode('utf-8'))
+            h.update(part.get('data', b''))
+        else:  # PIL.Image
+            h.update(part.tobytes())
+    h.update(repr(sorted(kwargs.items())).encode('utf-8'))
+    return h.hexdigest()
+
+def _gemini_system_instruction(gemini_client):
+    """get_gemini_client で生成したモデルのシステム指示を返す（指示なしで生成したモデルはNone）"""
+    entry = _gemini_system_instructions.get(id(gemini_client))
+    if entry is None or entry[0] is not gemini_client:
+        raise ValueError("get_gemini_client で生成していないモデルは応答キャッシュに使えません")
+    return entry[1]
+
+def _generate_content_cached(gemini_client, contents, **kwargs) -> str:
+    """gemini_client.generate_content の応答テキストを返す（TTL付きでプロセス内キャッシュ）"""
+    # システム指示の異なるモデルを区別するため、モデル名と合わせてキーに含める
+    # （SDKの非公開属性ではなく、get_gemini_client に渡した指示を使う）
+    system_instruction = _gemini_system_instruction(gemini_client)
+    key = _llm_cache_key(f"{gemini_client.model_name}\n{system_instruction or ''}", contents, kwargs)
+    now = time.time()
+    with _llm_cache_lock:
+        entry = _llm_cache.get(key)
+        if entry and now - entry[1] < LLM_CACHE_TTL:
+            return entry[0]
+
+    # stream=Trueは使わない（呼び出し元はいずれもJSON解析・Docs挿入に完全な応答を必要とするため、
+    # 逐次受信しても完了までの時間は変わらない）
+    text = gemini_client.generate_content(contents, **kwargs).text
+    with _llm_cache_lock:
+        if len(_llm_cache) >= LLM_CACHE_MAX_ENTRIES:
+            for k in [k for k, (_, cached_at) in _llm_cache.items() if now - cached_at >= LLM_CACHE_TTL]:
+                del _llm_cache[k]
+            if len(_llm_cache) >= LLM_CACHE_MAX_ENTRIES:
+                # 期限内のエントリで埋まっている場合は最も古いものを捨てる
+                del _llm_cache[min(_llm_cache, key=lambda k: _llm_cache[k][1])]
+        _llm_cache[key] = (text, now)
+    return text
+
+def extract_text_from_pdf(file_data) -> str:
+    """PDFバイナリデータ（bytes または BytesIO 等のストリーム）からテキストを抽出
+
+    PyMuPDF（pypdfより1桁高速）を使い、PyMuPDFで開けない場合のみpypdfで再試行する。
+    """
     try:
-        pdf_file = io.BytesIO(file_data)
-        reader = PdfReader(pdf_file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
+        import fitz  # PyMuPDF
+        # ページ単位の並列化はしない（PyMuPDFは1ドキュメントを複数スレッドから扱えない。
+        # 並列性はメール単位・添付ファイル単位のワーカーで確保している）
+        with fitz.open(stream=file_data, filetype="pdf") as doc:
+            text = "\n".join(page.get_text("text") for page in doc)
         return text.strip()
     except Exception as e:
-        print(f"PDF解析エラー: {e}")
-        return ""
+        print(f"PDF解析エラー（pypdfで再試行）: {e}")
 
-def extract_text_from_image(file_data: bytes, gemini_client) -> str:
-    """画像ファイルからテキストを抽出（Gemini Vision使用）"""
+    # PyMuPDFで開けないPDFはpypdfでフォールバック
+    # （通常経路のPyMuPDFはテキスト層のみを抽出し、図形描画オペレータの解釈コストはかからない）
     try:
-        import PIL.Image
-        image = PIL.Image.open(io.BytesIO(file_data))
+        from pypdf import PdfReader
+        if isinstance(file_data, (bytes, bytearray)):
+            file_data = io.BytesIO(file_data)
+        else:
+            file_data.seek(0)
+        reader = PdfReader(file_data)
+        text = "\n".join(page.extract_text() or "" for page in reader.pages)
+        return text.strip()
+    except Exception as e:
+        print(f"PDF解析エラー: {e}")
+        return ""
 
-        prompt = """この画像は不動産の販売図面です。画像内のすべてのテキストを抽出してください。
+# Gemini Visionに送る画像の最大辺（文字読み取りにはこれで十分、1568pxはタイル分割が増えない上限）
+GEMINI_IMAGE_MAX_SIDE = 1568
+
+def _prepare_image_for_gemini(file_data: bytes) -> dict:
+    """画像を縮小・JPEG再圧縮してGeminiに渡せる形式にする（送信量と処理時間を削減）"""
+    import PIL.Image
+    image = PIL.Image.open(io.BytesIO(file_data))
+    image.thumbnail((GEMINI_IMAGE_MAX_SIDE, GEMINI_IMAGE_MAX_SIDE), PIL.Image.LANCZOS)
+    buf = io.BytesIO()
+    image.convert('RGB').save(buf, 'JPEG', quality=85, optimize=True)
+    return {'mime_type': 'image/jpeg', 'data': buf.getvalue()}
+
+# テキスト層がこれより短いPDFは画像化された図面とみなし、1ページ目をVisionで読む
+PDF_MIN_TEXT_CHARS = 50
+
+def _render_pdf_first_page_for_gemini(file_data) -> dict:
+    """PDFの1ページ目を画像化してGeminiに渡せる形式にする（スキャン・画像化された販売図面向け）"""
+    import fitz  # PyMuPDF
+    with fitz.open(stream=file_data, filetype="pdf") as doc:
+        page = doc[0]
+        zoom = min(2.0, GEMINI_IMAGE_MAX_SIDE / max(page.rect.width, page.rect.height))
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        return {'mime_type': 'image/jpeg', 'data': pix.tobytes("jpeg", jpg_quality=85)}
+
+# 画像からの文字起こしプロンプト
+_IMAGE_TEXT_PROMPT = """この画像は不動産の販売図面です。画像内のすべてのテキストを抽出してください。
 特に以下の情報を正確に抽出してください：
 - 住所
 - 物件番号
@@ -173,61 +409,72 @@ def extract_text_from_image(file_data: bytes, gemini_client) -> str:
 
 すべてのテキストを改行で区切って出力してください。"""
 
-        response = gemini_client.generate_content([prompt, image])
-        text = response.text.strip()
+def extract_text_from_image(file_data: bytes, gemini_client) -> str:
+    """画像ファイルからテキストを抽出（Gemini Vision使用）"""
+    try:
+        image = _prepare_image_for_gemini(file_data)
+        text = _generate_content_cached(gemini_client, [_IMAGE_TEXT_PROMPT, image]).strip()
         print(f"画像からテキスト抽出完了: {len(text)} 文字")
         return text
     except Exception as e:
         print(f"画像解析エラー: {e}")
-        import traceback
         traceback.print_exc()
         return ""
 
+# Gemini応答を囲むマークダウンコードブロック（```json ... ```）の除去用
+# 囲みの前後に説明文が付いていても中身だけを取り出せるよう、先頭・末尾に固定せず検索する
+_CODE_FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)\s*```', re.S)
+
+def _strip_code_fence(text):
+    """コードブロックで囲まれていれば中身を、囲まれていなければ全体を返す"""
+    match = _CODE_FENCE_RE.search(text)
+    return match.group(1) if match else text.strip()
+
+# 数値として扱う項目
+_NUMERIC_FIELDS = ('price', 'land_area', 'building_area', 'total_units',
+                   'full_occupancy_rent', 'management_fee', 'reserve_fund')
+_ROOM_NUMERIC_FIELDS = ('area', 'rent')
+
+# 全角数字・記号を半角へ寄せる変換表と、数値以外の記号・単位の除去パターン
+_NUM_TRANS = str.maketrans('０１２３４５６７８９，．－−', '0123456789,.--')
+_NUM_STRIP_RE = re.compile(r'[¥￥円,\s㎡戸]')
+# 「1億2000万」「5000万」「85000」「-100」のような表記を分解する
+_JP_NUM_RE = re.compile(r'(-)?(?:(\d+(?:\.\d+)?)億)?(?:(\d+(?:\.\d+)?)万)?(\d+(?:\.\d+)?)?')
+
+def _to_num(value):
+    """文字列で返された数値をfloatに変換（全角数字・万/億表記・負数に対応、変換できなければNone）"""
+    if isinstance(value, str):
+        text = _NUM_STRIP_RE.sub('', value.translate(_NUM_TRANS))
+        match = _JP_NUM_RE.fullmatch(text)
+        if not match or not any(match.groups()[1:]):
+            return None
+        sign, oku, man, rest = match.groups()
+        num = float(oku or 0) * 100000000 + float(man or 0) * 10000 + float(rest or 0)
+        return -num if sign else num
+    return value
+
 def parse_gemini_property_response(response_text: str) -> dict:
     """GeminiのJSON応答を安全にパース"""
     try:
-        import json
-
         # マークダウンコードブロック（```json```）を除去
-        text = response_text.strip()
-        if text.startswith('```'):
-            # ```json で始まる場合
-            text = text.split('```')[1]
-            if text.startswith('json'):
-                text = text[4:]
-            text = text.strip()
+        text = _strip_code_fence(response_text)
 
         # JSON パース
         data = json.loads(text)
 
         # 数値型への変換（文字列として返される可能性があるため）
-        numeric_fields = ['price', 'land_area', 'building_area', 'total_units',
-                         'full_occupancy_rent', 'management_fee', 'reserve_fund']
-
-        for field in numeric_fields:
-            if field in data and data[field] is not None:
-                try:
-                    # カンマ除去して数値変換
-                    if isinstance(data[field], str):
-                        data[field] = float(data[field].replace(',', ''))
-                except (ValueError, AttributeError):
-                    data[field] = None
+        for field in _NUMERIC_FIELDS:
+            if data.get(field) is not None:
+                data[field] = _to_num(data[field])
 
         # rent_rollの各部屋の数値も変換
         if data.get('rent_roll') and isinstance(data['rent_roll'], list):
             for room in data['rent_roll']:
-                if 'area' in room and room['area'] is not None:
-                    try:
-                        if isinstance(room['area'], str):
-                            room['area'] = float(room['area'].replace(',', ''))
-                    except (ValueError, AttributeError):
-                        room['area'] = None
-                if 'rent' in room and room['rent'] is not None:
-                    try:
-                        if isinstance(room['rent'], str):
-                            room['rent'] = float(room['rent'].replace(',', ''))
-                    except (ValueError, AttributeError):
-                        room['rent'] = None
+                if not isinstance(room, dict):
+                    continue
+                for field in _ROOM_NUMERIC_FIELDS:
+                    if room.get(field) is not None:
+                        room[field] = _to_num(room[field])
 
         return data
 
@@ -239,91 +486,11 @@ def parse_gemini_property_response(response_text: str) -> dict:
         print(f"予期しないエラー: {e}")
         return {}
 
-def extract_comprehensive_property_data(file_data: bytes, filename: str, gemini_client) -> dict:
-    """販売図面から包括的な物件情報を抽出（Gemini使用）"""
-    try:
-        # ファイル種別判定
-        is_pdf = filename.lower().endswith('.pdf')
-        is_image = filename.lower().endswith(('.jpg', '.jpeg', '.png'))
+# 包括的データ抽出のプロンプト（PDFテキスト・画像で共通）
+# システム指示としてモデルに持たせ、呼び出し毎には可変のテキスト/画像だけを送る
+_COMPREHENSIVE_PROMPT = """あなたは不動産販売図面から物件情報を抽出する専門AIです。
 
-        # テキスト抽出
-        if is_pdf:
-            # PDFからテキスト抽出
-            text = extract_text_from_pdf(file_data)
-            if not text:
-                print("PDFからのテキスト抽出に失敗")
-                return {}
-
-            # Geminiで構造化分析
-            prompt = f"""あなたは不動産販売図面から物件情報を抽出する専門AIです。
-
-以下のテキストから物件情報を抽出し、JSON形式で出力してください。
-
-【テキスト】
-{text}
-
-【抽出項目】
-1. 基本情報:
-   - property_number: 物件番号 (数字のみ)
-   - station: 最寄駅 (「駅」を除く駅名のみ)
-   - address: 住所 (完全な住所)
-
-2. 価格・構造:
-   - price: 販売価格 (円、数値のみ)
-   - structure: 構造 (RC, SRC, 木造など)
-   - year_built: 築年月 (YYYY年MM月 または YYYY/MM形式)
-
-3. 面積・規模:
-   - land_area: 土地面積 (㎡、数値のみ)
-   - building_area: 建物面積 (㎡、数値のみ)
-   - total_units: 総戸数 (数値のみ)
-
-4. 賃料情報:
-   - full_occupancy_rent: 満室想定賃料 (月額円、数値のみ)
-   - floor_plan: 間取り (例: 1K, 1DK, 2LDK)
-   - management_fee: 管理費 (月額円、数値のみ)
-   - reserve_fund: 修繕積立金 (月額円、数値のみ)
-
-5. レントロール (部屋別賃料一覧):
-   - rent_roll: 配列形式 [{{"room": "部屋番号", "plan": "間取り", "area": 面積, "rent": 賃料}}, ...]
-
-【重要な指示】
-- 情報が見つからない場合は null を設定
-- 推測や補完は禁止、記載されている情報のみ抽出
-- 数値は数字のみ抽出（単位記号、カンマは除く）
-- 出力は必ず有効なJSON形式
-
-【出力形式】
-{{
-  "property_number": "物件番号 or null",
-  "station": "駅名 or null",
-  "address": "住所 or null",
-  "price": 価格数値 or null,
-  "structure": "構造 or null",
-  "year_built": "築年月 or null",
-  "land_area": 面積数値 or null,
-  "building_area": 面積数値 or null,
-  "total_units": 戸数 or null,
-  "full_occupancy_rent": 賃料数値 or null,
-  "floor_plan": "間取り or null",
-  "management_fee": 管理費数値 or null,
-  "reserve_fund": 積立金数値 or null,
-  "rent_roll": [配列] or null
-}}
-"""
-            response = gemini_client.generate_content(prompt)
-            result = parse_gemini_property_response(response.text)
-            print(f"PDF詳細抽出完了: {len(result)} フィールド")
-            return result
-
-        elif is_image:
-            # Gemini Visionで画像を直接分析
-            import PIL.Image
-            image = PIL.Image.open(io.BytesIO(file_data))
-
-            prompt = """あなたは不動産販売図面から物件情報を抽出する専門AIです。
-
-この画像から物件情報を抽出し、JSON形式で出力してください。
+与えられた販売図面（テキストまたは画像）から物件情報を抽出し、JSON形式で出力してください。
 
 【抽出項目】
 1. 基本情報:
@@ -374,88 +541,176 @@ def extract_comprehensive_property_data(file_data: bytes, filename: str, gemini_
   "rent_roll": [配列] or null
 }
 """
-            response = gemini_client.generate_content([prompt, image])
-            result = parse_gemini_property_response(response.text)
-            print(f"画像詳細抽出完了: {len(result)} フィールド")
-            return result
 
+def extract_comprehensive_property_data(file_data: bytes, filename: str, pdf_text: Optional[str] = None) -> dict:
+    """販売図面から包括的な物件情報を抽出（_COMPREHENSIVE_PROMPTをシステム指示に持つGeminiモデルを使用）
+
+    pdf_text に販売図面判定で抽出済みのPDFテキストを渡すと、PDFの再解析を省く
+    """
+    try:
+        gemini_client = get_gemini_client(_COMPREHENSIVE_PROMPT)
+
+        # ファイル種別判定
+        is_pdf = filename.lower().endswith('.pdf')
+        is_image = filename.lower().endswith(('.jpg', '.jpeg', '.png'))
+
+        if is_pdf:
+            # PDFからテキスト抽出してGeminiで構造化分析（抽出済みならそれを使う）
+            text = pdf_text if pdf_text is not None else extract_text_from_pdf(file_data)
+            if len(text) >= PDF_MIN_TEXT_CHARS:
+                contents = f"【テキスト】\n{text}\n"
+                kind = 'PDF'
+            else:
+                # テキスト層がほぼ無い（画像化された図面）場合は1ページ目をVisionで分析
+                print(f"PDFのテキストが少ないため1ページ目を画像として分析: {len(text)} 文字")
+                try:
+                    contents = [_render_pdf_first_page_for_gemini(file_data)]
+                except Exception as e:
+                    print(f"PDFページの画像化に失敗: {e}")
+                    return {}
+                kind = 'PDF(画像)'
+        elif is_image:
+            # Gemini Visionで画像を直接分析（縮小・JPEG再圧縮してから送信）
+            contents = [_prepare_image_for_gemini(file_data)]
+            kind = '画像'
         else:
             print(f"サポートされていないファイル形式: {filename}")
             return {}
 
+        result = parse_gemini_property_response(_generate_content_cached(gemini_client, contents))
+        print(f"{kind}詳細抽出完了: {len(result)} フィールド")
+        return result
+
     except Exception as e:
         print(f"包括的データ抽出エラー: {e}")
-        import traceback
         traceback.print_exc()
         return {}
 
+# 販売図面に特有のキーワード
+_HANBAIZUMEN_KEYWORDS = (
+    '販売図面',
+    '物件番号',
+    '専有面積',
+    '間取り',
+    'バルコニー面積',
+    '築年月',
+    '総戸数',
+    '管理費',
+    '修繕積立金',
+    '販売価格',  # Phase 1で追加
+    '構造',  # Phase 1で追加
+    '満室想定賃料',  # Phase 1で追加
+    'レントロール'  # Phase 1で追加
+)
+# 全キーワードを1回の走査で探すための選択パターン
+# 長いキーワードを先に並べ、部分文字列関係にあるキーワードが追加されても長い方を優先させる
+# （十数語程度なのでAho-Corasick等の外部ライブラリは使わず、is_hanbaizumen側で3種類到達時に打ち切る）
+_HANBAIZUMEN_KEYWORDS_RE = re.compile(
+    '|'.join(map(re.escape, sorted(_HANBAIZUMEN_KEYWORDS, key=len, reverse=True)))
+)
+
 def is_hanbaizumen(text: str) -> bool:
     """テキスト内容から販売図面かどうかを判定（キーワードベース）"""
-    # 販売図面に特有のキーワード
-    keywords = [
-        '販売図面',
-        '物件番号',
-        '専有面積',
-        '間取り',
-        'バルコニー面積',
-        '築年月',
-        '総戸数',
-        '管理費',
-        '修繕積立金',
-        '販売価格',  # Phase 1で追加
-        '構造',  # Phase 1で追加
-        '満室想定賃料',  # Phase 1で追加
-        'レントロール'  # Phase 1で追加
-    ]
-
-    # 3つ以上のキーワードが含まれていれば販売図面と判定
-    match_count = sum(1 for keyword in keywords if keyword in text)
-    print(f"販売図面判定: {match_count}個のキーワードマッチ")
-    return match_count >= 3
+    # 3種類以上のキーワードが含まれていれば販売図面と判定（3種類見つかった時点で打ち切り）
+    found = set()
+    for match in _HANBAIZUMEN_KEYWORDS_RE.finditer(text):
+        found.add(match.group(0))
+        if len(found) >= 3:
+            print("販売図面判定: 3個以上のキーワードマッチ")
+            return True
+    print(f"販売図面判定: {len(found)}個のキーワードマッチ")
+    return False
+
+# 住所抽出パターン（モジュール読み込み時にコンパイル）
+# 「都道府県 + 〜市/〜区 + 以降」を1パターンで1回だけ走査する
+_ADDRESS_RE = re.compile(
+    r'(東京都|大阪府|京都府|北海道|[一-龥]+県)[一-龥ぁ-んa-zA-Z0-9ー\s]+[市区][一-龥ぁ-んa-zA-Z0-9ー\s]+'
+)
 
 def extract_address_with_regex(text: str) -> Optional[str]:
     """正規表現で住所を抽出"""
-    patterns = [
-        r'(東京都|大阪府|京都府|北海道|[一-龥]+県)[一-龥ぁ-んa-zA-Z0-9ー\s]+市[一-龥ぁ-んa-zA-Z0-9ー\s]+',
-        r'(東京都|大阪府|京都府|北海道|[一-龥]+県)[一-龥ぁ-んa-zA-Z0-9ー\s]+区[一-龥ぁ-んa-zA-Z0-9ー\s]+',
-        r'東京都[一-龥ぁ-んa-zA-Z0-9ー\s]+区[一-龥ぁ-んa-zA-Z0-9ー\s]+[0-9]+',
-    ]
+    match = _ADDRESS_RE.search(text)
+    return match.group(0) if match else None
 
-    for pattern in patterns:
-        match = re.search(pattern, text)
-        if match:
-            return match.group(0)
-    return None
+def extract_address_and_market_report_with_gemini(text: str, property_info: dict, gemini_client):
+    """Gemini APIで住所抽出と相場調査を1回のリクエストで行う（正規表現で住所が取れない場合用）
 
-def extract_address_with_gemini(text: str, gemini_client) -> Optional[str]:
-    """Gemini APIで住所を抽出（フォールバック）"""
+    Returns:
+        tuple: (住所 or None, research_market_price と同じ形式の相場調査結果 or None)
+    """
     try:
         prompt = f"""
-以下のテキストから不動産物件の住所を抽出してください。
-住所のみを出力してください（説明不要）。
+あなたは不動産投資の専門家です。以下の販売図面テキストから物件の住所を抽出し、
+その物件の周辺の類似物件の家賃相場を調査してください。
 
-テキスト:
+物件情報:
+- 駅: {property_info.get('station', '不明')}
+- 物件番号: {property_info.get('property_number')}
+
+販売図面テキスト:
 {text[:2000]}
+
+相場調査は以下の形式でレポートしてください:
+1. 周辺エリアの特徴
+2. 類似物件の家賃相場（ワンルーム、1K、1DK、2DKなど）
+3. 相場の根拠となる情報源
+4. 投資観点での評価コメント
+
+相場調査はプレーンテキストで出力してください。マークダウン記法（#、##、###、**、*、```等）は一切使わないでください。
+見出しには番号を付けて区別してください（例: 「1. 周辺エリアの特徴」）。
+
+JSON形式で回答（住所が見つからない場合はaddressをnull）:
+{{"address": "住所のみ", "market_report": "相場調査レポート"}}
 """
-        response = gemini_client.generate_content(prompt)
-        address = response.text.strip()
-        return address if address else None
+        result = json.loads(_generate_content_cached(
+            gemini_client,
+            prompt,
+            generation_config={'response_mime_type': 'application/json'}
+        ))
+
+        address = (result.get('address') or '').strip() or None
+        market_data = None
+        if result.get('market_report'):
+            market_data = {
+                'status': 'success',
+                'report': result['market_report'],
+                'model': 'gemini-2.5-flash'
+            }
+        return address, market_data
     except Exception as e:
-        print(f"Gemini住所抽出エラー: {e}")
-        return None
+        print(f"Gemini住所抽出・相場調査エラー: {e}")
+        return None, None
+
+# Geocoding結果のキャッシュ（同一建物の別部屋などで同じ住所が繰り返し来るため）
+GEOCODE_CACHE_MAX_ENTRIES = 4096
+_geocode_cache_lock = threading.Lock()
+_geocode_cache = {}  # 正規化した住所 -> 位置情報
 
 def geocode_address(address: str, gmaps_client) -> Optional[dict]:
-    """住所から位置情報を取得"""
+    """住所から位置情報を取得（正規化した住所でキャッシュ）"""
+    # 全角/半角や前後の空白の違いを吸収
+    key = unicodedata.normalize('NFKC', address).strip()
+    with _geocode_cache_lock:
+        cached = _geocode_cache.get(key)
+    if cached:
+        return dict(cached)
+
     try:
-        geocode_result = gmaps_client.geocode(address, language='ja')
+        # OVER_QUERY_LIMITはgooglemapsクライアントが指数バックオフで自動リトライする
+        geocode_result = gmaps_client.geocode(key, language='ja')
         if geocode_result:
             location = geocode_result[0]['geometry']['location']
             formatted_address = geocode_result[0]['formatted_address']
-            return {
+            result = {
                 'lat': location['lat'],
                 'lng': location['lng'],
                 'formatted_address': formatted_address
             }
+            with _geocode_cache_lock:
+                if len(_geocode_cache) >= GEOCODE_CACHE_MAX_ENTRIES:
+                    _geocode_cache.clear()
+                _geocode_cache[key] = result
+            return dict(result)
         return None
     except Exception as e:
         print(f"Geocoding エラー: {e}")
@@ -482,10 +737,10 @@ def research_market_price(location: dict, property_info: dict, gemini_client) ->
 プレーンテキストで出力してください。マークダウン記法（#、##、###、**、*、```等）は一切使わないでください。
 見出しには番号を付けて区別してください（例: 「1. 周辺エリアの特徴」）。
 """
-        response = gemini_client.generate_content(prompt)
+        report_text = _generate_content_cached(gemini_client, prompt)
         return {
             'status': 'success',
-            'report': response.text,
+            'report': report_text,
             'model': 'gemini-2.0-flash-exp'
         }
     except Exception as e:
@@ -540,13 +795,12 @@ def research_area_with_gemini_search(location: dict, property_info: dict, gemini
 """
 
         from google.generativeai.types import content_types
-        response = gemini_client.generate_content(
+        report_text = _generate_content_cached(
+            gemini_client,
             prompt,
             tools='google_search_retrieval'
         )
 
-        report_text = response.text
-
         return {
             'status': 'success',
             'report': report_text,
@@ -555,7 +809,6 @@ def research_area_with_gemini_search(location: dict, property_info: dict, gemini
 
     except Exception as e:
         print(f"Gemini Web Searchエリア調査エラー: {e}")
-        import traceback
         traceback.print_exc()
         return {
             'status': 'error',
@@ -563,22 +816,28 @@ def research_area_with_gemini_search(location: dict, property_info: dict, gemini
             'report': 'エリア調査に失敗しました。'
         }
 
-def _strip_markdown(text: str) -> str:
-    """Markdown記法をプレーンテキストに変換"""
+# Markdown → プレーンテキスト変換ルール（適用順に並べる）
+_MARKDOWN_RULES = [
     # 見出し記号を除去 (### heading → heading)
-    text = re.sub(r'^#{1,6}\s+', '', text, flags=re.MULTILINE)
+    (re.compile(r'^#{1,6}\s+', re.MULTILINE), ''),
     # 太字/斜体を除去 (**text** → text, *text* → text)
-    text = re.sub(r'\*{1,3}(.+?)\*{1,3}', r'\1', text)
+    (re.compile(r'\*{1,3}(.+?)\*{1,3}'), r'\1'),
     # コードブロックを除去
-    text = re.sub(r'```[\s\S]*?```', '', text)
+    (re.compile(r'```[\s\S]*?```'), ''),
     # インラインコードを除去
-    text = re.sub(r'`([^`]+)`', r'\1', text)
+    (re.compile(r'`([^`]+)`'), r'\1'),
     # リンク [text](url) → text (url)
-    text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'\1 (\2)', text)
+    (re.compile(r'\[([^\]]+)\]\(([^)]+)\)'), r'\1 (\2)'),
     # 水平線 --- を除去
-    text = re.sub(r'^-{3,}$', '', text, flags=re.MULTILINE)
+    (re.compile(r'^-{3,}$', re.MULTILINE), ''),
     # 連続空行を1行に
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    (re.compile(r'\n{3,}'), '\n\n'),
+]
+
+def _strip_markdown(text: str) -> str:
+    """Markdown記法をプレーンテキストに変換"""
+    for pattern, repl in _MARKDOWN_RULES:
+        text = pattern.sub(repl, text)
     return text.strip()
 
 
@@ -611,9 +870,9 @@ def _find_placeholder_range(docs_service, doc_id, placeholder):
     doc = docs_service.documents().get(documentId=doc_id).execute()
     for element in doc['body']['content']:
         if 'paragraph' in element:
-            full_text = ''
-            for run in element['paragraph'].get('elements', []):
-                full_text += run.get('textRun', {}).get('content', '')
+            full_text = ''.join(
+                run.get('textRun', {}).get('content', '') for run in element['paragraph'].get('elements', [])
+            )
             if placeholder in full_text:
                 return element['startIndex'], element['endIndex']
     return None, None
@@ -633,60 +892,45 @@ def _rgb(color_dict):
     return {'color': {'rgbColor': color_dict}}
 
 
-def _insert_table_at_placeholder(docs_service, doc_id, placeholder, rows_data, col_count):
-    """プレースホルダーをスタイル付きテーブルに置換"""
-    start, end = _find_placeholder_range(docs_service, doc_id, placeholder)
-    if start is None:
-        print(f"プレースホルダー未検出: {placeholder}")
-        return
+def _utf16_len(text):
+    """Docs APIのインデックス単位（UTF-16コードユニット）での文字列長"""
+    return len(text.encode('utf-16-le')) // 2
 
-    # プレースホルダー行を削除
-    docs_service.documents().batchUpdate(
-        documentId=doc_id,
-        body={'requests': [{'deleteContentRange': {'range': {'startIndex': start, 'endIndex': end}}}]}
-    ).execute()
 
-    # テーブル挿入
-    row_count = len(rows_data)
-    docs_service.documents().batchUpdate(
-        documentId=doc_id,
-        body={'requests': [{'insertTable': {
-            'rows': row_count, 'columns': col_count,
-            'location': {'index': start}
-        }}]}
-    ).execute()
+def _build_table_requests(start, end, rows_data, col_count):
+    """プレースホルダー段落 [start, end) をスタイル付きテーブルに置換するリクエストを組み立てる
 
-    # ドキュメント再取得してテーブル構造を取得
-    doc = docs_service.documents().get(documentId=doc_id).execute()
-    table_element = None
-    table_start_index = None
-    for element in doc['body']['content']:
-        if 'table' in element and element['startIndex'] >= start:
-            table_element = element
-            table_start_index = element['startIndex']
-            break
+    insertTable は挿入位置の前に改行を1つ追加するため、テーブル開始は start + 1。
+    空テーブルのセル(r, c)の段落開始位置は start + 4 + r * (1 + 2 * col_count) + 2 * c
+    （テーブル・行・セルの開始がそれぞれ1、空セルの改行が1）。
+    ドキュメントを再取得せずにセル位置を計算できる。
 
-    if not table_element:
-        print(f"テーブル未検出: {placeholder}")
-        return
+    Returns:
+        tuple: (削除・挿入・セル入力のリクエスト, スタイル適用のリクエスト)
+    """
+    row_count = len(rows_data)
+    table_start_index = start + 1
+    row_size = 1 + 2 * col_count
 
-    table = table_element['table']
+    def cell_text(r, c):
+        return str(rows_data[r][c]) if c < len(rows_data[r]) else ''
+
+    # プレースホルダー行を削除してテーブル挿入
+    requests = [
+        {'deleteContentRange': {'range': {'startIndex': start, 'endIndex': end}}},
+        {'insertTable': {
+            'rows': row_count, 'columns': col_count,
+            'location': {'index': start}
+        }}
+    ]
 
     # セルにデータを入力（逆順でインデックスずれ防止）
-    cell_requests = []
     for r in range(row_count - 1, -1, -1):
-        row = table['tableRows'][r]
         for c in range(col_count - 1, -1, -1):
-            cell = row['tableCells'][c]
-            cell_index = cell['content'][0]['paragraph']['elements'][0]['startIndex']
-            text = str(rows_data[r][c]) if c < len(rows_data[r]) else ''
+            text = cell_text(r, c)
             if text:
-                cell_requests.append({'insertText': {'location': {'index': cell_index}, 'text': text}})
-
-    if cell_requests:
-        docs_service.documents().batchUpdate(
-            documentId=doc_id, body={'requests': cell_requests}
-        ).execute()
+                cell_index = start + 4 + r * row_size + 2 * c
+                requests.append({'insertText': {'location': {'index': cell_index}, 'text': text}})
 
     # === テーブルスタイリング ===
     style_requests = []
@@ -746,58 +990,33 @@ def _insert_table_at_placeholder(docs_service, doc_id, placeholder, rows_data, c
         }
     })
 
-    if style_requests:
-        try:
-            docs_service.documents().batchUpdate(documentId=doc_id, body={'requests': style_requests}).execute()
-        except Exception as e:
-            print(f"テーブルスタイル適用エラー（無視）: {e}")
-
-    # ドキュメント再取得（テキスト挿入でインデックスが変わったため）
-    doc = docs_service.documents().get(documentId=doc_id).execute()
-    table_element = None
-    for element in doc['body']['content']:
-        if 'table' in element and element['startIndex'] >= start:
-            table_element = element
-            break
-
-    if not table_element:
-        return
-
-    table = table_element['table']
-
-    # ヘッダー行テキスト: 白・太字・フォント設定
-    text_requests = []
-    header_row = table['tableRows'][0]
-    for c in range(col_count):
-        cell = header_row['tableCells'][c]
-        el = cell['content'][0]['paragraph']['elements'][0]
-        cs = el['startIndex']
-        ce = el.get('endIndex', cs)
-        if ce > cs:
-            text_requests.append({
-                'updateTextStyle': {
-                    'range': {'startIndex': cs, 'endIndex': ce - 1},
-                    'textStyle': {
-                        'bold': True,
-                        'foregroundColor': _rgb(_HEADER_TEXT),
-                        'fontSize': {'magnitude': 9, 'unit': 'PT'},
-                    },
-                    'fields': 'bold,foregroundColor,fontSize'
-                }
-            })
-
-    # データ行テキスト: フォントサイズ統一
-    for r in range(1, row_count):
-        row = table['tableRows'][r]
+    # セル内テキスト: ヘッダー行は白・太字、データ行はフォントサイズ統一
+    # 入力後のセル位置 = 空テーブルでの位置 + それより前のセルに入力した文字数
+    inserted = 0
+    for r in range(row_count):
         for c in range(col_count):
-            cell = row['tableCells'][c]
-            el = cell['content'][0]['paragraph']['elements'][0]
-            cs = el['startIndex']
-            ce = el.get('endIndex', cs)
-            if ce > cs:
-                text_requests.append({
+            text = cell_text(r, c)
+            if not text:
+                continue
+            cs = start + 4 + r * row_size + 2 * c + inserted
+            ce = cs + _utf16_len(text)
+            inserted += _utf16_len(text)
+            if r == 0:
+                style_requests.append({
                     'updateTextStyle': {
-                        'range': {'startIndex': cs, 'endIndex': ce - 1},
+                        'range': {'startIndex': cs, 'endIndex': ce},
+                        'textStyle': {
+                            'bold': True,
+                            'foregroundColor': _rgb(_HEADER_TEXT),
+                            'fontSize': {'magnitude': 9, 'unit': 'PT'},
+                        },
+                        'fields': 'bold,foregroundColor,fontSize'
+                    }
+                })
+            else:
+                style_requests.append({
+                    'updateTextStyle': {
+                        'range': {'startIndex': cs, 'endIndex': ce},
                         'textStyle': {
                             'fontSize': {'magnitude': 9, 'unit': 'PT'},
                         },
@@ -805,19 +1024,12 @@ def _insert_table_at_placeholder(docs_service, doc_id, placeholder, rows_data, c
                     }
                 })
 
-    if text_requests:
-        try:
-            docs_service.documents().batchUpdate(documentId=doc_id, body={'requests': text_requests}).execute()
-        except Exception:
-            pass
+    return requests, style_requests
 
 
 def _insert_map_image(docs_service, drive_service, doc_id, location):
     """地図画像をDrive経由でプレースホルダー位置に挿入"""
     try:
-        import requests as req
-        from googleapiclient.http import MediaIoBaseUpload
-
         start, end = _find_placeholder_range(docs_service, doc_id, '{{MAP_IMAGE}}')
         if start is None:
             print("地図プレースホルダー未検出")
@@ -839,14 +1051,13 @@ def _insert_map_image(docs_service, drive_service, doc_id, location):
             f"&markers=color:red%7C{lat},{lng}"
             f"&key={api_key}"
         )
-        resp = req.get(map_url, timeout=15)
+        resp = _get_http_session().get(map_url, timeout=15)
         if resp.status_code != 200:
             print(f"地図画像ダウンロード失敗: HTTP {resp.status_code}")
             return
 
-        # Driveにアップロード
-        image_data = io.BytesIO(resp.content)
-        media = MediaIoBaseUpload(image_data, mimetype='image/png', resumable=False)
+        # Driveにアップロード（数百KBなのでシンプルアップロード、添付ファイルと同じくバイト列をそのまま渡す）
+        media = MediaInMemoryUpload(resp.content, mimetype='image/png', resumable=False)
         map_file = drive_service.files().create(
             body={'name': 'map_temp.png', 'mimeType': 'image/png'},
             media_body=media, fields='id'
@@ -902,17 +1113,19 @@ def _insert_map_image(docs_service, drive_service, doc_id, location):
 
     except Exception as e:
         print(f"地図画像挿入エラー（無視）: {e}")
-        import traceback
         traceback.print_exc()
 
 
 def create_evaluation_report(docs_service, drive_service, folder_id: str, report_data: dict) -> str:
     """Google Docsで要件定義書サンプル準拠の構造化レポートを作成"""
     try:
-        # ドキュメント作成
+        # ドキュメントを物件フォルダ内に直接作成（作成後の親フォルダ付け替えが不要）
         title = f"物件評価レポート_{report_data['property_number']}_{report_data['station']}"
-        doc = docs_service.documents().create(body={'title': title}).execute()
-        doc_id = doc['documentId']
+        doc = drive_service.files().create(
+            body={'name': title, 'mimeType': 'application/vnd.google-apps.document', 'parents': [folder_id]},
+            fields='id'
+        ).execute()
+        doc_id = doc['id']
 
         detailed = report_data.get('detailed_data', {})
         sim_result = detailed.get('simulation_result')
@@ -984,33 +1197,27 @@ def create_evaluation_report(docs_service, drive_service, folder_id: str, report
         sections.append((f"作成日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 'NORMAL_TEXT'))
 
         # === Step 2: テキスト一括挿入 + スタイル適用 ===
+        # テーブルも含めてbatchUpdate 1回で作成するため、各段落の位置（UTF-16単位）をここで確定させる
         full_text = "\n".join(s[0] for s in sections)
-        requests = [{'insertText': {'location': {'index': 1}, 'text': full_text}}]
-        docs_service.documents().batchUpdate(documentId=doc_id, body={'requests': requests}).execute()
 
-        # スタイル適用（段落スタイル + テキストスタイル）
-        style_requests = []
+        text_requests = [{'insertText': {'location': {'index': 1}, 'text': full_text}}]
         text_style_requests = []
+        placeholder_ranges = {}  # プレースホルダー -> 段落の [start, end)（末尾の改行を含む）
         idx = 1
         for text, style in sections:
-            end_idx = idx + len(text)
+            end_idx = idx + _utf16_len(text)
+            if text.startswith('{{'):
+                placeholder_ranges[text] = (idx, end_idx + 1)
             if style != 'NORMAL_TEXT':
-                style_requests.append({
+                text_requests.append({
                     'updateParagraphStyle': {
                         'range': {'startIndex': idx, 'endIndex': end_idx},
                         'paragraphStyle': {'namedStyleType': style},
                         'fields': 'namedStyleType'
                     }
                 })
-            idx = end_idx + 1
-
-        if style_requests:
-            docs_service.documents().batchUpdate(documentId=doc_id, body={'requests': style_requests}).execute()
 
-        # カスタムカラー・フォント適用
-        idx = 1
-        for text, style in sections:
-            end_idx = idx + len(text)
+            # カスタムカラー・フォント適用
             if style == 'SUBTITLE':
                 text_style_requests.append({
                     'updateTextStyle': {
@@ -1112,13 +1319,8 @@ def create_evaluation_report(docs_service, drive_service, folder_id: str, report
                 })
             idx = end_idx + 1
 
-        if text_style_requests:
-            try:
-                docs_service.documents().batchUpdate(documentId=doc_id, body={'requests': text_style_requests}).execute()
-            except Exception as e:
-                print(f"テキストスタイル適用エラー（無視）: {e}")
-
-        # === Step 3: テーブル挿入（末尾から逆順） ===
+        # === Step 3: テーブル挿入（末尾から逆順、前方のインデックスがずれないように） ===
+        tables = []  # (プレースホルダー, 行データ, 列数)
 
         # 投資分析結果テーブル
         if sim_result:
@@ -1148,7 +1350,7 @@ def create_evaluation_report(docs_service, drive_service, folder_id: str, report
             else:
                 sim_results_data.append(["NPV（正味現在価値）", "計算不可", "×"])
 
-            _insert_table_at_placeholder(docs_service, doc_id, '{{TABLE_SIM_RESULTS}}', sim_results_data, 3)
+            tables.append(('{{TABLE_SIM_RESULTS}}', sim_results_data, 3))
 
             # 設定条件テーブル
             sim_cond_data = [
@@ -1164,7 +1366,7 @@ def create_evaluation_report(docs_service, drive_service, folder_id: str, report
                 ["空室率", f"{p.get('vacancy_rate', 0.05):.0%}"],
                 ["保有期間", f"{p.get('holding_period', 10)}年"],
             ]
-            _insert_table_at_placeholder(docs_service, doc_id, '{{TABLE_SIM_CONDITIONS}}', sim_cond_data, 2)
+            tables.append(('{{TABLE_SIM_CONDITIONS}}', sim_cond_data, 2))
 
         # レントロールテーブル
         if detailed.get('rent_roll') and len(detailed['rent_roll']) > 0:
@@ -1176,7 +1378,7 @@ def create_evaluation_report(docs_service, drive_service, folder_id: str, report
                 plan_area = f"{plan}" + (f"（{area}畳）" if area else "")
                 rent = unit.get('rent', 0)
                 rent_data.append([str(room), plan_area, f"¥{rent:,.0f}"])
-            _insert_table_at_placeholder(docs_service, doc_id, '{{TABLE_RENT_ROLL}}', rent_data, 3)
+            tables.append(('{{TABLE_RENT_ROLL}}', rent_data, 3))
 
         # 基本情報テーブル
         basic_rows = [["項目", "内容"]]
@@ -1206,28 +1408,34 @@ def create_evaluation_report(docs_service, drive_service, folder_id: str, report
             maps_url = f"https://www.google.com/maps?q={location['lat']},{location['lng']}"
             basic_rows.append(["Google Maps", maps_url])
 
-        _insert_table_at_placeholder(docs_service, doc_id, '{{TABLE_BASIC_INFO}}', basic_rows, 2)
+        tables.append(('{{TABLE_BASIC_INFO}}', basic_rows, 2))
+
+        # テキスト・段落スタイル・テーブルをbatchUpdate 1回で適用（リクエストは順に適用される）
+        # 各テーブルのスタイルはそのテーブルの挿入直後、より前方のテーブルを挿入する前に置く
+        required_requests = list(text_requests)
+        all_requests = text_requests + text_style_requests
+        for placeholder, rows_data, col_count in tables:
+            start, end = placeholder_ranges[placeholder]
+            table_requests, table_style_requests = _build_table_requests(start, end, rows_data, col_count)
+            required_requests += table_requests
+            all_requests += table_requests + table_style_requests
+
+        try:
+            docs_service.documents().batchUpdate(documentId=doc_id, body={'requests': all_requests}).execute()
+        except Exception as e:
+            # スタイルはインデックスを動かさないので、本文とテーブルだけで再実行できる
+            print(f"スタイル適用エラー（スタイルなしで再実行）: {e}")
+            docs_service.documents().batchUpdate(documentId=doc_id, body={'requests': required_requests}).execute()
 
         # 地図画像挿入
         if location and location.get('lat') and location.get('lng'):
             _insert_map_image(docs_service, drive_service, doc_id, location)
 
-        # ドキュメントを物件フォルダに移動
-        file = drive_service.files().get(fileId=doc_id, fields='parents').execute()
-        previous_parents = ",".join(file.get('parents'))
-        drive_service.files().update(
-            fileId=doc_id,
-            addParents=folder_id,
-            removeParents=previous_parents,
-            fields='id, parents'
-        ).execute()
-
         print(f"レポート作成完了: {title}")
         return doc_id
 
     except Exception as e:
         print(f"レポート作成エラー: {e}")
-        import traceback
         traceback.print_exc()
         return None
 
@@ -1254,15 +1462,9 @@ def generate_property_evaluation_report(
             print(f"抽出済みテキスト使用: {len(text)} 文字")
         else:
             # PDFダウンロードしてテキスト抽出
-            request = drive_service.files().get_media(fileId=pdf_file_id)
-            fh = io.BytesIO()
-            from googleapiclient.http import MediaIoBaseDownload
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-
-            pdf_data = fh.getvalue()
+            # get_media().execute() は1リクエストで本文をbytesとして返す
+            # （MediaIoBaseDownloadのチャンク分割やBytesIOへの書き込みが不要）
+            pdf_data = drive_service.files().get_media(fileId=pdf_file_id).execute()
             print(f"PDF取得完了: {len(pdf_data)} bytes")
 
             text = extract_text_from_pdf(pdf_data)
@@ -1271,11 +1473,18 @@ def generate_property_evaluation_report(
                 return None
             print(f"テキスト抽出完了: {len(text)} 文字")
 
+        property_info = {
+            'property_number': property_number,
+            'station': station
+        }
+
         # 3. 住所抽出（正規表現 → Geminiフォールバック）
+        # Geminiを使う場合は相場調査も同じリクエストで行い、往復を1回減らす
+        market_data = None
         address = extract_address_with_regex(text)
         if not address:
-            print("正規表現で住所抽出失敗、Geminiを使用")
-            address = extract_address_with_gemini(text, gemini_client)
+            print("正規表現で住所抽出失敗、Geminiを使用（相場調査も同時に実行）")
+            address, market_data = extract_address_and_market_report_with_gemini(text, property_info, gemini_client)
 
         if not address:
             print("エラー: 住所抽出失敗")
@@ -1289,16 +1498,14 @@ def generate_property_evaluation_report(
             return None
         print(f"位置情報取得完了: {location}")
 
-        # 5. 相場調査（Gemini）
-        property_info = {
-            'property_number': property_number,
-            'station': station
-        }
-        market_data = research_market_price(location, property_info, gemini_client)
-        print(f"相場調査完了: {market_data['status']}")
-
-        # 5.5. エリア調査（Gemini Web Search）
-        area_data = research_area_with_gemini_search(location, property_info, gemini_client)
+        # 5. 相場調査（Gemini、住所抽出と同時に済んでいなければ）と
+        # 5.5. エリア調査（Gemini Web Search）は互いに独立しているため並列に実行
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            area_future = executor.submit(research_area_with_gemini_search, location, property_info, gemini_client)
+            if market_data is None:
+                market_data = research_market_price(location, property_info, gemini_client)
+            print(f"相場調査完了: {market_data['status']}")
+            area_data = area_future.result()
         print(f"エリア調査完了: {area_data['status']}")
 
         # 両方の調査結果を統合
@@ -1325,79 +1532,134 @@ def generate_property_evaluation_report(
 
     except Exception as e:
         print(f"レポート生成エラー: {e}")
-        import traceback
         traceback.print_exc()
         return None
 
+# ============================================================
+# Label / Folder ID Cache（TTL付き、スレッドセーフ）
+# ============================================================
+LOOKUP_CACHE_TTL = 3600
+LOOKUP_CACHE_MAX_ENTRIES = 1024
+_lookup_cache_lock = threading.Lock()
+_folder_locks_lock = threading.Lock()
+_folder_locks = {}  # (parent_folder_id, property_number) -> Lock（物件毎に検索〜作成を直列化）
+_label_cache = {}   # label_name -> (label_id, cached_at)
+_folder_cache = {}  # (parent_folder_id, folder_name, property_number) -> (folder_id, cached_at)
+
+def _lookup_cache_get(cache, key):
+    """TTL内のキャッシュ値を返す。なければNone"""
+    with _lookup_cache_lock:
+        entry = cache.get(key)
+    if entry and time.time() - entry[1] < LOOKUP_CACHE_TTL:
+        return entry[0]
+    return None
+
+def _lookup_cache_put(cache, key, value):
+    """キャッシュに保存（上限超過時は期限切れエントリを掃除）"""
+    now = time.time()
+    with _lookup_cache_lock:
+        if len(cache) >= LOOKUP_CACHE_MAX_ENTRIES:
+            for k in [k for k, (_, cached_at) in cache.items() if now - cached_at >= LOOKUP_CACHE_TTL]:
+                del cache[k]
+        cache[key] = (value, now)
+
 def get_or_create_label(gmail_service, label_name):
-    """Gmailラベルを取得または作成"""
-    labels = gmail_service.users().labels().list(userId='me').execute()
+    """Gmailラベルを取得または作成（IDはTTLキャッシュ）"""
+    label_id = _lookup_cache_get(_label_cache, label_name)
+    if label_id:
+        return label_id
+
+    # 一覧で得た全ラベルをキャッシュしておき、他のラベル名でのlabels.list呼び出しも省く
+    labels = gmail_service.users().labels().list(userId='me', fields='labels(id,name)').execute()
     for label in labels.get('labels', []):
-        if label['name'] == label_name:
-            return label['id']
+        _lookup_cache_put(_label_cache, label['name'], label['id'])
+    label_id = _lookup_cache_get(_label_cache, label_name)
+    if label_id:
+        return label_id
 
     # ラベル作成
     label = gmail_service.users().labels().create(
         userId='me',
         body={'name': label_name}
     ).execute()
+    _lookup_cache_put(_label_cache, label_name, label['id'])
     return label['id']
 
+# 物件情報抽出用の正規表現（モジュールロード時に1回だけコンパイル）
+# re.search(文字列パターン) はreモジュール内部のキャッシュ頼みになり、長時間稼働で追い出されると再コンパイルされる
+_RE_HANBAI = re.compile(r'Hanbaizumen_(\d+)')
+_RE_PROPSTATION = re.compile(r'物件番号[:：]\s*(\d+)\s*駅[:：]\s*([^\s\r\n]+)')
+_RE_PROPNUM = re.compile(r'物件番号[:：]\s*(\d+)')
+_RE_HID = re.compile(r'hid=(\d+)')
+_RE_STATION = re.compile(r'駅[:：]\s*([^\s\r\n,、]+)')
+
+# 販売図面メールからの物件番号・駅名抽出の固定指示（システム指示としてモデルに持たせ、本文だけを送る）
+_PROPERTY_INFO_SYSTEM_PROMPT = """あなたは不動産メールから物件情報を抽出する専門アシスタントです。
+
+タスク: 与えられたメール本文から物件番号と最寄駅を抽出してください。
+
+抽出条件:
+- 物件番号: "物件番号:数字" "物件番号：数字" "hid=数字" という記載から数字部分のみ
+- 駅名: "駅名+駅" "駅:駅名" "駅：駅名" という記載から駅名部分のみ（「駅」という文字は除く）
+- 見つからない場合はnull
+
+重要: メール本文に実際に書かれている情報のみを抽出してください。推測・補完は禁止です。
+
+JSON形式で回答:
+{"property_number": "数字のみ", "station": "駅名のみ"}"""
+
 def extract_property_info_from_hanbaizumen(message_body, attachments):
-    """販売図面メールから物件情報を抽出（Gemini使用）"""
+    """販売図面メールから物件情報を抽出（正規表現優先、取れない項目のみGemini使用）"""
     property_number = None
     station = None
     detailed_data = {}
 
     # 添付ファイル名から物件番号を抽出（優先）
     for att in attachments:
-        match = re.search(r'Hanbaizumen_(\d+)', att.get('filename', ''))
+        match = _RE_HANBAI.search(att.get('filename', ''))
         if match:
             property_number = match.group(1)
             break
 
-    # Gemini APIで本文から物件番号と駅名を抽出
-    try:
-        gemini_client = get_gemini_client()
-
-        prompt = f"""あなたは不動産メールから物件情報を抽出する専門アシスタントです。
+    # 本文の定型表記から正規表現で抽出（LLM呼び出しを避ける）
+    if not property_number:
+        match = _RE_PROPNUM.search(message_body) or _RE_HID.search(message_body)
+        if match:
+            property_number = match.group(1)
 
-タスク: 以下のメール本文から物件番号と最寄駅を抽出してください。
+    station_match = _RE_STATION.search(message_body)
+    if station_match:
+        station = station_match.group(1)
 
-抽出条件:
-- 物件番号: "物件番号:数字" "物件番号：数字" "hid=数字" という記載から数字部分のみ
-- 駅名: "駅名+駅" "駅:駅名" "駅：駅名" という記載から駅名部分のみ（「駅」という文字は除く）
-- 見つからない場合はnull
+    if property_number and station:
+        print(f"✅ 正規表現で抽出 - 物件番号: {property_number}, 駅: {station}")
+        return {
+            'property_number': property_number,
+            'station': station,
+            'detailed_data': detailed_data
+        }
 
-重要: メール本文に実際に書かれている情報のみを抽出してください。推測・補完は禁止です。
+    # 正規表現で取れなかった項目をGemini APIで本文から抽出
+    # （両方取れた定型メールは上で返しており、LLMを呼ぶのは非定型の本文だけ）
+    try:
+        gemini_client = get_gemini_client(_PROPERTY_INFO_SYSTEM_PROMPT)
 
-=== メール本文ここから ===
+        prompt = f"""=== メール本文ここから ===
 {message_body}
-=== メール本文ここまで ===
+=== メール本文ここまで ==="""
 
-JSON形式で回答:
-{{"property_number": "数字のみ", "station": "駅名のみ"}}"""
-
-        response = gemini_client.generate_content(prompt)
-        result_text = response.text.strip()
+        result_text = _generate_content_cached(gemini_client, prompt).strip()
 
         # JSONとして解析
-        import json
-        # ```json ``` で囲まれている場合は除去
-        if result_text.startswith('```'):
-            result_text = result_text.split('```')[1]
-            if result_text.startswith('json'):
-                result_text = result_text[4:]
-            result_text = result_text.strip()
-
-        result = json.loads(result_text)
+        # ```json ``` で囲まれている場合は除去（parse_gemini_property_responseと同じパターン）
+        result = json.loads(_strip_code_fence(result_text))
 
         # 物件番号（添付ファイル名から取得できていない場合のみ）
         if not property_number and result.get('property_number'):
             property_number = str(result['property_number'])
 
-        # 駅名
-        if result.get('station'):
+        # 駅名（正規表現で取得できていない場合のみ）
+        if not station and result.get('station'):
             station = result['station']
 
         print(f"✅ Gemini抽出成功 - 物件番号: {property_number}, 駅: {station}")
@@ -1407,26 +1669,14 @@ JSON形式で回答:
             filename = att.get('filename', '')
             attachment_id = att['body'].get('attachmentId')
 
-            if attachment_id and (filename.lower().endswith('.pdf') or
-                                filename.lower().endswith(('.jpg', '.jpeg', '.png'))):
-                try:
-                    import base64
-                    # attachmentは既にprocess_email_typeで取得される前提だが、
-                    # ここでは添付ファイルのメタデータのみ参照
-                    # 実際のファイルデータは後でprocess_email_typeで取得される
-                    print(f"📎 添付ファイル検出（詳細抽出は後で実行）: {filename}")
-                except Exception as att_e:
-                    print(f"⚠️  添付ファイル処理エラー: {att_e}")
+            if attachment_id and filename.lower().endswith(('.pdf', '.jpg', '.jpeg', '.png')):
+                # ここでは添付ファイルのメタデータのみ参照
+                # 実際のファイルデータは後で_process_single_messageで取得される
+                print(f"📎 添付ファイル検出（詳細抽出は後で実行）: {filename}")
 
     except Exception as e:
-        print(f"⚠️  Gemini抽出エラー（フォールバック実行）: {e}")
-
-        # フォールバック: URLから物件番号を取得
-        if not property_number:
-            url_match = re.search(r'hid=(\d+)', message_body)
-            if url_match:
-                property_number = url_match.group(1)
-                print(f"📍 URLから物件番号抽出: {property_number}")
+        # URLからの物件番号抽出は正規表現で実施済み
+        print(f"⚠️  Gemini抽出エラー（正規表現の結果を使用）: {e}")
 
     if not station:
         station = '不明'
@@ -1437,26 +1687,26 @@ JSON形式で回答:
         'detailed_data': detailed_data
     }
 
-def extract_property_info_from_chizu(message_body):
-    """住宅地図・路線価図メールから物件情報を抽出"""
+def extract_property_info_from_chizu(message_body, attachments=None):
+    """住宅地図・路線価図メールから物件情報を抽出（attachmentsは販売図面用と引数を揃えるためのもので未使用）"""
     property_number = None
     station = None
 
     # 本文から物件番号と駅名を抽出
-    match = re.search(r'物件番号[:：]\s*(\d+)\s*駅[:：]\s*([^\s\r\n]+)', message_body)
+    match = _RE_PROPSTATION.search(message_body)
     if match:
         property_number = match.group(1)
         station = match.group(2)
 
     # URLから物件番号を取得（バックアップ）
     if not property_number:
-        url_match = re.search(r'hid=(\d+)', message_body)
+        url_match = _RE_HID.search(message_body)
         if url_match:
             property_number = url_match.group(1)
 
     # 駅名が取れなかった場合
     if not station:
-        station_match = re.search(r'駅[:：]\s*([^\s\r\n,、]+)', message_body)
+        station_match = _RE_STATION.search(message_body)
         if station_match:
             station = station_match.group(1)
 
@@ -1471,25 +1721,47 @@ def extract_property_info_from_chizu(message_body):
     }
 
 def get_or_create_folder(drive_service, parent_folder_id, folder_name, property_number):
-    """Driveフォルダを取得または作成（物件番号で部分一致検索）"""
-    # まず完全一致で検索
-    query = f"name = '{folder_name}' and '{parent_folder_id}' in parents and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-    results = drive_service.files().list(q=query, fields='files(id, name)').execute()
-    files = results.get('files', [])
+    """Driveフォルダを取得または作成（物件番号で部分一致検索、IDはTTLキャッシュ）
 
-    if files:
-        return files[0]['id']
+    Returns:
+        tuple: (フォルダID, 今回新規作成したか)
+    """
+    key = (parent_folder_id, folder_name, property_number)
+    folder_id = _lookup_cache_get(_folder_cache, key)
+    if folder_id:
+        return folder_id, False
+
+    # 並列処理中に同じ物件のフォルダを重複作成しないよう、物件毎に検索〜作成を直列化
+    # （物件番号の部分一致でも既存フォルダを使うため、フォルダ名ではなく物件番号単位でロックする）
+    with _folder_locks_lock:
+        folder_lock = _folder_locks.setdefault((parent_folder_id, property_number), threading.Lock())
+    with folder_lock:
+        folder_id = _lookup_cache_get(_folder_cache, key)
+        if folder_id:
+            return folder_id, False
+        folder_id, created = _find_or_create_folder(drive_service, parent_folder_id, folder_name, property_number)
+        _lookup_cache_put(_folder_cache, key, folder_id)
+    return folder_id, created
+
+def _find_or_create_folder(drive_service, parent_folder_id, folder_name, property_number):
+    """Drive上でフォルダを検索し、なければ作成。(フォルダID, 新規作成したか)を返す"""
+    # 完全一致と物件番号の部分一致を1回のクエリで検索
+    query = (
+        f"'{parent_folder_id}' in parents and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
+        f" and (name = '{folder_name}' or name contains '_{property_number}')"
+    )
+    results = drive_service.files().list(q=query, fields='files(id, name)', pageSize=100).execute()
+    files = results.get('files', [])
 
-    # 物件番号で部分一致検索
-    partial_query = f"name contains '_{property_number}' and '{parent_folder_id}' in parents and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
-    partial_results = drive_service.files().list(q=partial_query, fields='files(id, name)', pageSize=10).execute()
-    partial_files = partial_results.get('files', [])
+    # 完全一致を優先
+    for folder in files:
+        if folder['name'] == folder_name:
+            return folder['id'], False
 
-    if partial_files:
-        for folder in partial_files:
-            if folder['name'].endswith(f'_{property_number}'):
-                print(f"既存フォルダを使用: {folder['name']}")
-                return folder['id']
+    for folder in files:
+        if folder['name'].endswith(f'_{property_number}'):
+            print(f"既存フォルダを使用: {folder['name']}")
+            return folder['id'], False
 
     # 新規作成
     print(f"フォルダ作成: {folder_name}")
@@ -1499,254 +1771,412 @@ def get_or_create_folder(drive_service, parent_folder_id, folder_name, property_
         'parents': [parent_folder_id]
     }
     folder = drive_service.files().create(body=folder_metadata, fields='id').execute()
-    return folder['id']
+    return folder['id'], True
+
+def list_file_names(drive_service, folder_id):
+    """フォルダ直下のファイル名一覧をsetで取得（1回のlistで全件、ページング対応）"""
+    names = set()
+    page_token = None
+    while True:
+        results = drive_service.files().list(
+            q=f"'{folder_id}' in parents and trashed = false",
+            fields='nextPageToken, files(name)',
+            pageSize=1000,
+            pageToken=page_token
+        ).execute()
+        names.update(f['name'] for f in results.get('files', []))
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return names
 
-def save_attachment(drive_service, folder_id, filename, content):
-    """添付ファイルをDriveに保存"""
-    # 既存ファイルチェック
-    query = f"name = '{filename}' and '{folder_id}' in parents and trashed = false"
-    results = drive_service.files().list(q=query, fields='files(id)').execute()
-    if results.get('files'):
-        return  # 既に存在
+# BatchHttpRequest 1回あたりの件数（Gmailの上限は100件だが、50件を超えると同時実行制限の429が出やすい）
+GMAIL_BATCH_SIZE = 50
 
-    # ファイル保存
-    file_metadata = {
-        'name': filename,
-        'parents': [folder_id]
-    }
-    drive_service.files().create(
-        body=file_metadata,
-        media_body=content,
-        fields='id'
-    ).execute()
+def batch_get_messages(gmail, messages, **kwargs):
+    """messages().get をBatchHttpRequestでまとめて取得（GMAIL_BATCH_SIZE件ずつ）
 
-def process_email_type(gmail, drive, query, label_name, processed_label_id, investment_folder_id, extract_info_fn):
-    """特定タイプのメールを処理"""
-    results = []
+    Returns:
+        dict: メッセージID → メッセージ。取得失敗分は含まない
+    """
+    fetched = {}
 
-    response = gmail.users().messages().list(userId='me', q=query).execute()
-    messages = response.get('messages', [])
+    def on_msg(request_id, response, exception):
+        if exception is not None:
+            print(f"メール取得エラー: {request_id}: {exception}")
+            return
+        fetched[request_id] = response
 
-    print(f"検索クエリ: {query}")
-    print(f"該当メール数: {len(messages)}")
+    for i in range(0, len(messages), GMAIL_BATCH_SIZE):
+        batch = gmail.new_batch_http_request(callback=on_msg)
+        for msg in messages[i:i + GMAIL_BATCH_SIZE]:
+            batch.add(gmail.users().messages().get(userId='me', id=msg['id'], **kwargs), request_id=msg['id'])
+        batch.execute()
 
-    for msg in messages:
-        try:
-            message = gmail.users().messages().get(userId='me', id=msg['id']).execute()
+    return fetched
 
-            # 本文取得（再帰的にpartsを探索）
-            import base64
-            body = ""
-            attachments = []
+def batch_get_attachments(gmail, message_id, parts):
+    """attachments().get をBatchHttpRequestでまとめて取得（GMAIL_BATCH_SIZE件ずつ）
 
-            def extract_body_and_attachments(parts):
-                nonlocal body, attachments
-                for part in parts:
-                    mime_type = part.get('mimeType', '')
+    Returns:
+        dict: attachmentId → デコード済みバイト列。取得失敗分は含まない
+    """
+    fetched = {}
 
-                    # text/plain を見つけたら本文として取得
-                    if mime_type == 'text/plain' and 'data' in part.get('body', {}):
-                        body = base64.urlsafe_b64decode(part['body']['data']).decode('utf-8', errors='ignore')
+    def on_attachment(request_id, response, exception):
+        part = parts[int(request_id)]
+        if exception is not None:
+            print(f"添付ファイル取得エラー: {part.get('filename')}: {exception}")
+            return
+        fetched[part['body']['attachmentId']] = base64.urlsafe_b64decode(response['data'])
+
+    for i in range(0, len(parts), GMAIL_BATCH_SIZE):
+        batch = gmail.new_batch_http_request(callback=on_attachment)
+        for j in range(i, min(i + GMAIL_BATCH_SIZE, len(parts))):
+            batch.add(
+                gmail.users().messages().attachments().get(
+                    userId='me', messageId=message_id, id=parts[j]['body']['attachmentId']
+                ),
+                request_id=str(j)
+            )
+        batch.execute()
 
-                    # 添付ファイル
-                    if part.get('filename'):
-                        attachments.append(part)
+    return fetched
 
-                    # multipart/* の場合は再帰的に探索
-                    if mime_type.startswith('multipart/') and 'parts' in part:
-                        extract_body_and_attachments(part['parts'])
+# messages().get で取得するフィールド（ヘッダー・labelIds等を除外し、ネストしたpartsは保持）
+# idはバッチのrequest_idで分かるため不要、snippetは警告ログ用、internalDateはフォルダ名の日付用
+_PART_FIELDS = 'mimeType,filename,body(data,attachmentId)'
+for _ in range(4):
+    _PART_FIELDS = f'mimeType,filename,body(data,attachmentId),parts({_PART_FIELDS})'
+MESSAGE_FIELDS = f'snippet,internalDate,payload({_PART_FIELDS})'
 
-            if 'parts' in message['payload']:
-                extract_body_and_attachments(message['payload']['parts'])
+# これより大きい添付ファイルのみresumableアップロードを使用
+RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024
 
-            # parts がない、またはbodyが空の場合のフォールバック
-            if not body and 'body' in message['payload'] and 'data' in message['payload']['body']:
-                body = base64.urlsafe_b64decode(message['payload']['body']['data']).decode('utf-8', errors='ignore')
+# ファイル名から販売図面ではないと分かる添付ファイル（買付書・地図）の接頭辞（小文字）
+NON_HANBAIZUMEN_PREFIXES = ('kaitsuke', 'map')
 
-            # 物件情報抽出
-            info = extract_info_fn(body, attachments) if len(extract_info_fn.__code__.co_varnames) > 1 else extract_info_fn(body)
+# /test で候補ファイルを先読みする並列数
+TEST_PREFETCH_WORKERS = 4
 
-            # 新形式（dict）と旧形式（tuple）の両方に対応
-            if isinstance(info, dict):
-                property_number = info.get('property_number')
-                station = info.get('station')
-                detailed_data = info.get('detailed_data', {})
-            else:
-                # 旧形式（tuple）
-                property_number, station = info
-                detailed_data = {}
+# メール処理の並列数（全リクエストで共有、Gmail APIのクォータ保護のため上限を設ける）
+MESSAGE_WORKERS = int(os.environ.get('EMAIL_WORKERS', '20'))
 
-            if not property_number:
-                print(f"⚠️  物件番号を抽出できませんでした（処理は継続）: {message.get('snippet', '')[:50]}")
-                # 物件番号がない場合はメッセージIDの一部を使用
-                property_number = msg['id'][:8]
+# 同時に来た/processリクエスト間でもワーカースレッドを共有し、
+# スレッド毎にキャッシュしたAPIサービスも使い回す
+_message_executor = ThreadPoolExecutor(max_workers=MESSAGE_WORKERS, thread_name_prefix='message')
 
-            print(f"処理中: 物件番号={property_number} 駅={station}")
+# 添付ファイルアップロードの並列数
+# メールワーカーから投入するため、デッドロックしないよう別プールにする
+ATTACHMENT_WORKERS = 5
+_attachment_executor = ThreadPoolExecutor(max_workers=ATTACHMENT_WORKERS, thread_name_prefix='attachment')
 
-            # メール受信日を取得
-            date_str = datetime.now().strftime('%Y%m%d')
+def _walk_parts(payload):
+    """メールのpartsを走査して本文と添付ファイルを取得（スタックで深さ優先、元の順序を保持）
 
-            # フォルダ名を生成
-            folder_name = f"{date_str}_{station}_{property_number}"
+    Returns:
+        tuple: (本文, 添付ファイルのpartリスト)
+    """
+    body_data = None
+    attachments = []
+
+    stack = list(reversed(payload.get('parts', [])))
+    while stack:
+        part = stack.pop()
+        mime_type = part.get('mimeType', '')
+
+        # text/plain を見つけたら本文として取得（デコードは走査後に最後の1つだけ行う）
+        if mime_type == 'text/plain' and 'data' in part.get('body', {}):
+            body_data = part['body']['data']
+
+        # 添付ファイル
+        if part.get('filename'):
+            attachments.append(part)
+
+        # multipart/* の場合は子partsも探索
+        if mime_type.startswith('multipart/') and 'parts' in part:
+            stack.extend(reversed(part['parts']))
+
+    body = base64.urlsafe_b64decode(body_data).decode('utf-8', errors='ignore') if body_data else ""
+
+    # parts がない、またはbodyが空の場合のフォールバック
+    if not body and 'data' in payload.get('body', {}):
+        body = base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8', errors='ignore')
+
+    return body, attachments
+
+def _upload_attachment(folder_id, filename, file_data):
+    """添付ファイルをDriveにアップロードしてファイルIDを返す（ワーカースレッドで実行）"""
+    # ファイル保存（BytesIOで包まずデコード済みバイト列をそのまま渡す）
+    # 小さいファイルはシンプルアップロード（resumableはセッション開始で1往復多い）
+    media = MediaInMemoryUpload(
+        file_data,
+        mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+        resumable=len(file_data) > RESUMABLE_UPLOAD_THRESHOLD
+    )
+    file_metadata = {
+        'name': filename,
+        'parents': [folder_id]
+    }
+    uploaded_file = get_drive_service().files().create(body=file_metadata, media_body=media, fields='id').execute()
+    return uploaded_file['id']
 
-            # フォルダ作成
-            folder_id = get_or_create_folder(drive, investment_folder_id, folder_name, property_number)
+def _process_single_message(msg, message, processed_label_id, investment_folder_id, extract_info_fn):
+    """メール1件を処理（ワーカースレッドで実行）
 
-            # 添付ファイル保存
-            for part in attachments:
-                filename = part.get('filename')
-                attachment_id = part['body'].get('attachmentId')
+    Returns:
+        str: 処理結果。失敗時はNone
+    """
+    try:
+        # httplib2はスレッドセーフでないため、スレッド毎のサービスを使用
+        gmail = get_gmail_service()
+        drive = get_drive_service()
 
-                if attachment_id:
-                    attachment = gmail.users().messages().attachments().get(
-                        userId='me', messageId=msg['id'], id=attachment_id
-                    ).execute()
+        # 本文と添付ファイルを取得
+        body, attachments = _walk_parts(message['payload'])
 
-                    import base64
-                    file_data = base64.urlsafe_b64decode(attachment['data'])
+        # 物件情報抽出
+        # 抽出関数はいずれも (本文, 添付ファイル) を受け取る
+        info = extract_info_fn(body, attachments)
 
-                    # 既存ファイルチェック
-                    query_file = f"name = '{filename}' and '{folder_id}' in parents and trashed = false"
-                    existing = drive.files().list(q=query_file, fields='files(id)').execute()
+        # 新形式（dict）と旧形式（tuple）の両方に対応
+        if isinstance(info, dict):
+            property_number = info.get('property_number')
+            station = info.get('station')
+            detailed_data = info.get('detailed_data', {})
+        else:
+            # 旧形式（tuple）
+            property_number, station = info
+            detailed_data = {}
 
-                    if existing.get('files'):
-                        print(f"スキップ（既存）: {filename}")
-                        continue
+        if not property_number:
+            print(f"⚠️  物件番号を抽出できませんでした（処理は継続）: {message.get('snippet', '')[:50]}")
+            # 物件番号がない場合はメッセージIDの一部を使用
+            property_number = msg['id'][:8]
 
-                    # ファイル保存
-                    from io import BytesIO
-                    from googleapiclient.http import MediaIoBaseUpload
+        print(f"処理中: 物件番号={property_number} 駅={station}")
 
-                    media = MediaIoBaseUpload(BytesIO(file_data), mimetype='application/octet-stream', resumable=True)
-                    file_metadata = {
-                        'name': filename,
-                        'parents': [folder_id]
-                    }
-                    uploaded_file = drive.files().create(body=file_metadata, media_body=media, fields='id').execute()
-                    print(f"保存完了: {filename} → {folder_name}")
-
-                    # PDF/画像の場合、中身を確認して販売図面か判定
-                    is_pdf = filename.lower().endswith('.pdf')
-                    is_image = filename.lower().endswith(('.jpg', '.jpeg', '.png'))
-
-                    if is_pdf or is_image:
-                        # テキスト抽出
-                        if is_pdf:
-                            extracted_text = extract_text_from_pdf(file_data)
-                        else:  # 画像
-                            gemini_client = get_gemini_client()
-                            extracted_text = extract_text_from_image(file_data, gemini_client)
-
-                        if is_hanbaizumen(extracted_text):
-                            try:
-                                print(f"販売図面検出、評価レポート生成を開始: {filename}")
-
-                                # APIクライアント初期化
-                                docs_service = get_docs_service()
-                                gmaps_client = get_gmaps_client()
-                                gemini_client = get_gemini_client()
-
-                                # 包括的な物件データを抽出
-                                comprehensive_data = extract_comprehensive_property_data(
-                                    file_data, filename, gemini_client
-                                )
-                                print(f"詳細データ抽出完了: {len(comprehensive_data)} フィールド")
-
-                                # 投資シミュレーション実行
-                                simulation_result = None
-                                try:
-                                    simulation_result = run_simulation(comprehensive_data)
-                                    if simulation_result:
-                                        print(f"投資シミュレーション完了: {simulation_result['decision']['recommendation']}")
-                                        excel_file_id = create_simulation_excel(
-                                            simulation_result,
-                                            {"property_number": property_number, "station": station},
-                                            drive, folder_id
-                                        )
-                                        if excel_file_id:
-                                            print(f"シミュレーションExcel保存完了: {excel_file_id}")
-                                    else:
-                                        print("投資シミュレーションスキップ（データ不足）")
-                                except Exception as sim_e:
-                                    print(f"投資シミュレーションエラー（処理継続）: {sim_e}")
-                                    import traceback
-                                    traceback.print_exc()
-
-                                if simulation_result:
-                                    comprehensive_data['simulation_result'] = simulation_result
-
-                                # レポート生成（extracted_textと詳細データを渡す）
-                                report_doc_id = generate_property_evaluation_report(
-                                    drive_service=drive,
-                                    docs_service=docs_service,
-                                    gmaps_client=gmaps_client,
-                                    gemini_client=gemini_client,
-                                    folder_id=folder_id,
-                                    pdf_file_id=uploaded_file['id'],
-                                    property_number=property_number,
-                                    station=station,
-                                    extracted_text=extracted_text,
-                                    detailed_data=comprehensive_data
+        # メール受信日を取得（処理時刻だと日付を跨いだ再処理でフォルダが分かれるため）
+        if 'internalDate' in message:
+            date_str = datetime.fromtimestamp(int(message['internalDate']) / 1000).strftime('%Y%m%d')
+        else:
+            date_str = datetime.now().strftime('%Y%m%d')
+
+        # フォルダ名を生成
+        folder_name = f"{date_str}_{station}_{property_number}"
+
+        # フォルダ作成
+        folder_id, folder_created = get_or_create_folder(drive, investment_folder_id, folder_name, property_number)
+
+        # 既存ファイル名を一括取得（添付ファイル毎のlist呼び出しを避ける）
+        # 今作成したフォルダは空なので問い合わせ不要
+        existing_names = set() if folder_created else list_file_names(drive, folder_id)
+
+        # 未保存の添付ファイルだけをバッチでまとめてダウンロード
+        pending = [
+            part for part in attachments
+            if part['body'].get('attachmentId') and part.get('filename') not in existing_names
+        ]
+        attachment_data = batch_get_attachments(gmail, msg['id'], pending) if pending else {}
+
+        # 1件でも取得に失敗したらメール全体を失敗扱いにする
+        # （処理済みラベルを付けずに残し、次回の実行で再取得させる）
+        failed = [part.get('filename') for part in pending if part['body']['attachmentId'] not in attachment_data]
+        if failed:
+            raise RuntimeError(f"添付ファイルの取得に失敗: {', '.join(failed)}")
+
+        # アップロード対象を確定（同名の添付ファイルは最初の1件のみ）
+        uploads = []
+        for part in attachments:
+            filename = part.get('filename')
+            attachment_id = part['body'].get('attachmentId')
+
+            if attachment_id:
+                # 既存ファイルチェック
+                if filename in existing_names:
+                    print(f"スキップ（既存）: {filename}")
+                    continue
+
+                file_data = attachment_data[attachment_id]
+                existing_names.add(filename)
+                uploads.append((filename, file_data))
+
+        # 添付ファイル保存（並列アップロード）
+        uploaded_file_ids = list(_attachment_executor.map(
+            lambda upload: _upload_attachment(folder_id, upload[0], upload[1]),
+            uploads
+        ))
+
+        for (filename, file_data), uploaded_file_id in zip(uploads, uploaded_file_ids):
+            print(f"保存完了: {filename} → {folder_name}")
+
+            # PDF/画像の場合、中身を確認して販売図面か判定
+            is_pdf = filename.lower().endswith('.pdf')
+            is_image = filename.lower().endswith(('.jpg', '.jpeg', '.png'))
+
+            if is_pdf or is_image:
+                # 買付書・地図はファイル名で販売図面ではないと分かるので、テキスト抽出（画像ならVision呼び出し）を省く
+                lower_name = filename.lower()
+                if lower_name.startswith(NON_HANBAIZUMEN_PREFIXES):
+                    continue
+
+                # テキスト抽出
+                if is_pdf:
+                    extracted_text = extract_text_from_pdf(file_data)
+                else:  # 画像
+                    extracted_text = extract_text_from_image(file_data, get_gemini_client())
+
+                # Hanbaizumen_*** は名前で販売図面と分かるためキーワード判定を省く
+                if lower_name.startswith('hanbaizumen') or is_hanbaizumen(extracted_text):
+                    try:
+                        print(f"販売図面検出、評価レポート生成を開始: {filename}")
+
+                        # APIクライアント取得（いずれもインスタンス/スレッド内で使い回し）
+                        docs_service = get_docs_service()
+                        gmaps_client = get_gmaps_client()
+                        gemini_client = get_gemini_client()
+
+                        # 包括的な物件データを抽出
+                        comprehensive_data = extract_comprehensive_property_data(
+                            file_data, filename, pdf_text=extracted_text if is_pdf else None
+                        )
+                        print(f"詳細データ抽出完了: {len(comprehensive_data)} フィールド")
+
+                        # 投資シミュレーション実行
+                        simulation_result = None
+                        try:
+                            simulation_result = run_simulation(comprehensive_data)
+                            if simulation_result:
+                                print(f"投資シミュレーション完了: {simulation_result['decision']['recommendation']}")
+                                excel_file_id = create_simulation_excel(
+                                    simulation_result,
+                                    {"property_number": property_number, "station": station},
+                                    drive, folder_id
                                 )
+                                if excel_file_id:
+                                    print(f"シミュレーションExcel保存完了: {excel_file_id}")
+                            else:
+                                print("投資シミュレーションスキップ（データ不足）")
+                        except Exception as sim_e:
+                            print(f"投資シミュレーションエラー（処理継続）: {sim_e}")
+                            traceback.print_exc()
+
+                        if simulation_result:
+                            comprehensive_data['simulation_result'] = simulation_result
+
+                        # レポート生成（extracted_textと詳細データを渡す）
+                        report_doc_id = generate_property_evaluation_report(
+                            drive_service=drive,
+                            docs_service=docs_service,
+                            gmaps_client=gmaps_client,
+                            gemini_client=gemini_client,
+                            folder_id=folder_id,
+                            pdf_file_id=uploaded_file_id,
+                            property_number=property_number,
+                            station=station,
+                            extracted_text=extracted_text,
+                            detailed_data=comprehensive_data
+                        )
+
+                        if report_doc_id:
+                            print(f"評価レポート生成成功: {report_doc_id}")
+                        else:
+                            print(f"評価レポート生成失敗（処理は継続）")
+                    except Exception as e:
+                        print(f"レポート生成エラー（処理継続）: {e}")
+                        traceback.print_exc()
+
+        # 処理済みラベルはprocess_email_typeでまとめて付与
+        return f"Processed: {folder_name}"
 
-                                if report_doc_id:
-                                    print(f"評価レポート生成成功: {report_doc_id}")
-                                else:
-                                    print(f"評価レポート生成失敗（処理は継続）")
-                            except Exception as e:
-                                print(f"レポート生成エラー（処理継続）: {e}")
-                                import traceback
-                                traceback.print_exc()
-
-            # 処理済みラベル追加
-            gmail.users().messages().modify(
-                userId='me',
-                id=msg['id'],
-                body={'addLabelIds': [processed_label_id]}
-            ).execute()
+    except Exception as e:
+        print(f"エラー: {e}")
+        traceback.print_exc()
+        return None
 
-            results.append(f"Processed: {folder_name}")
+def process_email_type(gmail, query, processed_label_id, investment_folder_id, extract_info_fn):
+    """特定タイプのメールを処理"""
+    response = gmail.users().messages().list(
+        userId='me', q=query, includeSpamTrash=False, fields='messages/id,nextPageToken'
+    ).execute()
+    messages = response.get('messages', [])
+
+    print(f"検索クエリ: {query}")
+    print(f"該当メール数: {len(messages)}")
 
+    fetched_messages = batch_get_messages(gmail, messages, format='full', fields=MESSAGE_FIELDS)
+    targets = [(msg, fetched_messages[msg['id']]) for msg in messages if msg['id'] in fetched_messages]
+    if not targets:
+        return []
+
+    processed = list(_message_executor.map(
+        lambda target: _process_single_message(
+            target[0], target[1], processed_label_id, investment_folder_id, extract_info_fn
+        ),
+        targets
+    ))
+
+    # 処理済みラベルを一括付与（batchModifyは1回1000件まで）
+    # ラベル付与の失敗で処理結果を捨てないよう、失敗時はメール毎の付与に切り替える
+    processed_ids = [target[0]['id'] for target, result in zip(targets, processed) if result]
+    for i in range(0, len(processed_ids), 1000):
+        chunk = processed_ids[i:i + 1000]
+        try:
+            gmail.users().messages().batchModify(
+                userId='me',
+                body={'ids': chunk, 'addLabelIds': [processed_label_id]}
+            ).execute()
         except Exception as e:
-            print(f"エラー: {e}")
-            import traceback
+            print(f"処理済みラベル一括付与エラー（個別付与に切替）: {e}")
             traceback.print_exc()
+            for message_id in chunk:
+                try:
+                    gmail.users().messages().modify(
+                        userId='me', id=message_id, body={'addLabelIds': [processed_label_id]}
+                    ).execute()
+                except Exception as e:
+                    print(f"処理済みラベル付与エラー ({message_id}): {e}")
+                    traceback.print_exc()
 
-    return results
+    return [result for result in processed if result]
 
 def process_emails():
     """メールを処理"""
     gmail = get_gmail_service()
-    drive = get_drive_service()
 
-    investment_folder_id = _read_secret("INVESTMENT_FOLDER_ID")
-    label_name = _read_secret("PROCESSED_LABEL_NAME")
+    secrets = _read_secrets(["INVESTMENT_FOLDER_ID", "PROCESSED_LABEL_NAME"])
+    investment_folder_id = secrets["INVESTMENT_FOLDER_ID"]
+    label_name = secrets["PROCESSED_LABEL_NAME"]
     processed_label_id = get_or_create_label(gmail, label_name)
 
-    all_results = []
+    # 処理済み除外は -label:<ラベル名> で行う（qのlabel:はIDではなく名前で解決される）。
+    # labelIds=['INBOX'] での絞り込みはフィルタでアーカイブされたメールを取りこぼすため使わない
+    email_types = [
+        # 販売図面メール
+        (f'subject:販売図面 newer_than:15m has:attachment -label:{label_name}',
+         extract_property_info_from_hanbaizumen),
+        # 住宅地図・路線価図メール
+        (f'subject:住宅地図・路線価図 newer_than:15m has:attachment -label:{label_name}',
+         extract_property_info_from_chizu),
+    ]
 
-    # 販売図面メールを処理
-    query1 = f'subject:販売図面 newer_than:15m has:attachment -label:{label_name}'
-    results1 = process_email_type(
-        gmail, drive, query1, label_name, processed_label_id,
-        investment_folder_id, extract_property_info_from_hanbaizumen
-    )
-    all_results.extend(results1)
+    def run(email_type):
+        query, extract_info_fn = email_type
+        # 別スレッドで実行するため、そのスレッドのGmailサービスを使う
+        # （Driveはメール毎のワーカースレッドで取得するのでここでは不要）
+        return process_email_type(
+            get_gmail_service(), query, processed_label_id, investment_folder_id, extract_info_fn
+        )
 
-    # 住宅地図・路線価図メールを処理
-    query2 = f'subject:住宅地図・路線価図 newer_than:15m has:attachment -label:{label_name}'
-    results2 = process_email_type(
-        gmail, drive, query2, label_name, processed_label_id,
-        investment_folder_id, extract_property_info_from_chizu
-    )
-    all_results.extend(results2)
+    # 2種類のメールは独立しているので並列に処理
+    all_results = []
+    with ThreadPoolExecutor(max_workers=len(email_types)) as executor:
+        for results in executor.map(run, email_types):
+            all_results.extend(results)
 
     return all_results
 
-@app.route('/', methods=['GET'])
-def index():
-    """手動実行用WebUI"""
-    html = """
+# 手動実行用WebUIのHTML（静的なのでリクエスト毎に組み立てない）
+_INDEX_HTML = """
     <!DOCTYPE html>
     <html lang="ja">
     <head>
@@ -1834,12 +2264,23 @@ def index():
     </body>
     </html>
     """
-    return html
+
+_INDEX_ETAG = hashlib.md5(_INDEX_HTML.encode('utf-8')).hexdigest()
+
+@app.route('/', methods=['GET'])
+def index():
+    """手動実行用WebUI（ETag付き、変更がなければ304）"""
+    response = app.make_response(_INDEX_HTML)
+    response.set_etag(_INDEX_ETAG)
+    response.headers['Cache-Control'] = 'public, max-age=3600'
+    return response.make_conditional(request)
 
 @app.route('/health', methods=['GET'])
 def health():
     """ヘルスチェック"""
-    return jsonify({"status": "ok"})
+    response = jsonify({"status": "ok"})
+    response.headers['Cache-Control'] = 'public, max-age=10'
+    return response
 
 @app.route('/auth-status', methods=['GET'])
 def auth_status():
@@ -1858,8 +2299,7 @@ def auth_status():
         }
         # Gmail APIで疎通確認
         try:
-            creds = get_credentials()
-            gmail = build('gmail', 'v1', credentials=creds)
+            gmail = get_gmail_service()
             profile = gmail.users().getProfile(userId='me').execute()
             status["gmail_email"] = profile.get("emailAddress")
             status["gmail_ok"] = True
@@ -1881,13 +2321,14 @@ def refresh_token_endpoint():
 
         if new_token:
             global _cached_creds, _cached_creds_expiry
+            secrets = _read_secrets(["GMAIL_CLIENT_ID", "GMAIL_CLIENT_SECRET"])
             with _creds_lock:
                 _cached_creds = Credentials(
                     token=None,
                     refresh_token=new_token,
                     token_uri="https://oauth2.googleapis.com/token",
-                    client_id=_read_secret("GMAIL_CLIENT_ID"),
-                    client_secret=_read_secret("GMAIL_CLIENT_SECRET"),
+                    client_id=secrets["GMAIL_CLIENT_ID"],
+                    client_secret=secrets["GMAIL_CLIENT_SECRET"],
                     scopes=ALL_SCOPES,
                 )
                 _cached_creds_expiry = 0
@@ -1902,7 +2343,6 @@ def refresh_token_endpoint():
             "token_valid": creds.token is not None,
         })
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return jsonify({
             "status": "error",
@@ -1911,6 +2351,25 @@ def refresh_token_endpoint():
                    "Secret Managerを更新してください。"
         }), 500
 
+@app.route('/clear-secret-cache', methods=['POST'])
+def clear_secret_cache_endpoint():
+    """シークレットローテーション後に、キャッシュ済みのシークレットとAPIクライアントを破棄する
+
+    環境変数（deploy.shの--set-secrets）で注入されたシークレットはリビジョン作成時に固定されるため、
+    ここでは更新されない（新しいリビジョンのデプロイが必要）
+    """
+    try:
+        # シークレットキャッシュ・Maps/Gemini/Perplexityクライアント・Credentialsを破棄
+        invalidate_credentials()
+        # 各スレッドのGmail/Drive/Docsサービスは、Credentialsが差し替わったことを
+        # _get_cached_serviceが検知して次回使用時に再buildする。このスレッドの分はここで捨てる
+        _service_local.services = {}
+        print("Secret cache cleared")
+        return jsonify({"status": "success", "message": "Secret cache cleared"})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 @app.route('/process', methods=['POST'])
 def process():
     """メール処理エンドポイント"""
@@ -1922,7 +2381,6 @@ def process():
             "details": results
         })
     except Exception as e:
-        import traceback
         print(f"ERROR: {e}")
         print(traceback.format_exc())
         return jsonify({
@@ -1957,67 +2415,58 @@ def test_folder(folder_id):
             return jsonify({"status": "error", "message": "PDF/画像ファイルが見つかりません"}), 404
 
         # 全ファイルを試して販売図面を探す
-        from googleapiclient.http import MediaIoBaseDownload
         gemini_client = get_gemini_client()
         target = None
         file_data = None
         extracted_text = ''
         is_sales = False
 
-        # 買付書・地図を後回しにソート
-        def sort_key(f):
-            name = f['name'].lower()
-            if name.startswith('kaitsuke') or name.startswith('map'):
-                return 1
-            return 0
-        sorted_files = sorted(files, key=sort_key)
-
-        for candidate in sorted_files:
-            print(f"ファイル確認中: {candidate['name']}")
-            req = drive.files().get_media(fileId=candidate['id'])
-            fh = io.BytesIO()
-            dl = MediaIoBaseDownload(fh, req)
-            done = False
-            while not done:
-                _, done = dl.next_chunk()
-            candidate_data = fh.getvalue()
-
-            is_pdf = candidate['name'].lower().endswith('.pdf')
-            if is_pdf:
-                candidate_text = extract_text_from_pdf(candidate_data)
-            else:
-                candidate_text = extract_text_from_image(candidate_data, gemini_client)
-
-            if is_hanbaizumen(candidate_text):
-                target = candidate
-                file_data = candidate_data
-                extracted_text = candidate_text
-                is_sales = True
-                print(f"販売図面発見: {candidate['name']}")
-                break
-            print(f"  → 販売図面ではない ({len(candidate_text)}文字)")
-
-        # 販売図面が見つからない場合は最初のファイルを使用
+        # 買付書・地図を後回しにソート（小文字化したファイル名はソートと種別判定で使い回す）
+        candidates = sorted(
+            ((f, f['name'].lower()) for f in files),
+            key=lambda c: 1 if c[1].startswith(NON_HANBAIZUMEN_PREFIXES) else 0
+        )
+
+        def download_and_extract(candidate, lower_name):
+            # スレッド毎のDriveサービスを使う（httplib2はスレッドセーフでない）
+            data = get_drive_service().files().get_media(fileId=candidate['id']).execute()
+            if lower_name.endswith('.pdf'):
+                return data, extract_text_from_pdf(data)
+            return data, extract_text_from_image(data, gemini_client)
+
+        # ダウンロードとテキスト抽出を先読みで並列実行し、判定はソート順に行う
+        executor = ThreadPoolExecutor(max_workers=TEST_PREFETCH_WORKERS)
+        try:
+            futures = [executor.submit(download_and_extract, c, n) for c, n in candidates]
+            for (candidate, _), future in zip(candidates, futures):
+                print(f"ファイル確認中: {candidate['name']}")
+                candidate_data, candidate_text = future.result()
+
+                if is_hanbaizumen(candidate_text):
+                    target = candidate
+                    file_data = candidate_data
+                    extracted_text = candidate_text
+                    is_sales = True
+                    print(f"販売図面発見: {candidate['name']}")
+                    break
+                print(f"  → 販売図面ではない ({len(candidate_text)}文字)")
+        finally:
+            # 販売図面が見つかったら未着手の先読みは取り消す（実行中のものは待たずに返す）
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # 販売図面が見つからない場合は最初のファイルを使用（先読み済みの結果を再利用）
         if target is None:
-            target = sorted_files[0]
-            req = drive.files().get_media(fileId=target['id'])
-            fh = io.BytesIO()
-            dl = MediaIoBaseDownload(fh, req)
-            done = False
-            while not done:
-                _, done = dl.next_chunk()
-            file_data = fh.getvalue()
-            is_pdf_fallback = target['name'].lower().endswith('.pdf')
-            if is_pdf_fallback:
-                extracted_text = extract_text_from_pdf(file_data)
-            else:
-                extracted_text = extract_text_from_image(file_data, gemini_client)
+            target = candidates[0][0]
+            file_data, extracted_text = futures[0].result()
             print(f"販売図面なし、フォールバック: {target['name']}")
 
         print(f"対象ファイル: {target['name']} (販売図面: {is_sales})")
 
         # 包括的データ抽出
-        comprehensive_data = extract_comprehensive_property_data(file_data, target['name'], gemini_client)
+        is_target_pdf = target['name'].lower().endswith('.pdf')
+        comprehensive_data = extract_comprehensive_property_data(
+            file_data, target['name'], pdf_text=extracted_text if is_target_pdf else None
+        )
         print(f"データ抽出完了: {len(comprehensive_data)} フィールド")
 
         # シミュレーション
@@ -2039,7 +2488,6 @@ def test_folder(folder_id):
                 print("シミュレーションスキップ（データ不足）")
         except Exception as sim_e:
             print(f"シミュレーションエラー: {sim_e}")
-            import traceback
             traceback.print_exc()
 
         # レポート生成
@@ -2074,7 +2522,6 @@ def test_folder(folder_id):
         return jsonify(result)
 
     except Exception as e:
-        import traceback
         print(f"テストエラー: {e}")
         print(traceback.format_exc())
         return jsonify({"status": "error", "message": str(e)}), 500
@@ -2093,19 +2540,31 @@ def test_list_folders():
         ).execute()
         folders = results.get('files', [])
 
-        folder_list = []
-        for folder in folders:
-            fquery = f"'{folder['id']}' in parents and trashed=false"
-            files = drive.files().list(q=fquery, fields='files(mimeType)', pageSize=50).execute().get('files', [])
-            file_types = {}
-            for f in files:
-                mt = f['mimeType'].split('/')[-1]
-                file_types[mt] = file_types.get(mt, 0) + 1
-            folder_list.append({
-                "id": folder['id'],
-                "name": folder['name'],
-                "files": file_types,
-            })
+        # 全フォルダの中身を1つのクエリ（parentsのOR条件）でまとめて取得し、親フォルダ毎に集計
+        file_types = {folder['id']: {} for folder in folders}
+        if folders:
+            parents_query = ' or '.join(f"'{folder['id']}' in parents" for folder in folders)
+            page_token = None
+            while True:
+                results = drive.files().list(
+                    q=f"({parents_query}) and trashed=false",
+                    fields='nextPageToken, files(mimeType, parents)',
+                    pageSize=1000,
+                    pageToken=page_token
+                ).execute()
+                for f in results.get('files', []):
+                    mt = f['mimeType'].split('/')[-1]
+                    for parent in f.get('parents', []):
+                        if parent in file_types:
+                            file_types[parent][mt] = file_types[parent].get(mt, 0) + 1
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+
+        folder_list = [
+            {"id": folder['id'], "name": folder['name'], "files": file_types[folder['id']]}
+            for folder in folders
+        ]
 
         return jsonify({"status": "success", "folders": folder_list})
     except Exception as e:
@@ -1,37 +1,7 @@
 #!/usr/bin/env python3
 """指定メールから処理済みラベルを削除"""
 
-import os
-from google.cloud import secretmanager
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-
-def get_secret(secret_name):
-    """Secret Managerからシークレット取得"""
-    client = secretmanager.SecretManagerServiceClient()
-    project_id = "project-3255e657-b52f-4d63-ae7"
-    name = f"projects/{project_id}/secrets/{secret_name}/versions/latest"
-    response = client.access_secret_version(request={"name": name})
-    return response.payload.data.decode('UTF-8')
-
-def get_gmail_service():
-    """Gmail APIサービスを取得"""
-    client_id = get_secret("GMAIL_CLIENT_ID")
-    client_secret = get_secret("GMAIL_CLIENT_SECRET")
-    refresh_token = get_secret("GMAIL_REFRESH_TOKEN")
-
-    creds = Credentials(
-        token=None,
-        refresh_token=refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=client_id,
-        client_secret=client_secret,
-        scopes=[
-            "https://www.googleapis.com/auth/gmail.modify",
-            "https://www.googleapis.com/auth/gmail.labels"
-        ]
-    )
-    return build('gmail', 'v1', credentials=creds)
+from common import get_secret, gmail_service
 
 def get_label_id(gmail, label_name):
     """ラベル名からラベルIDを取得"""
@@ -48,7 +18,7 @@ def main():
     print()
 
     # Gmail API初期化
-    gmail = get_gmail_service()
+    gmail = gmail_service()
 
     # ラベルID取得
     label_name = get_secret("PROCESSED_LABEL_NAME")
@@ -75,20 +45,22 @@ def main():
         print("❌ 該当メールが見つかりません")
         return
 
-    # メール一覧表示
+    # メール一覧表示（snippetだけ必要なのでminimal + fieldsで本文・添付を取得しない）
+    snippets = {}
     for i, msg in enumerate(messages, 1):
-        message = gmail.users().messages().get(userId='me', id=msg['id']).execute()
-        snippet = message.get('snippet', '')
+        message = gmail.users().messages().get(
+            userId='me', id=msg['id'], format='minimal', fields='snippet'
+        ).execute()
+        snippets[msg['id']] = message.get('snippet', '')
 
-        print(f"{i}. {snippet[:100]}")
+        print(f"{i}. {snippets[msg['id']][:100]}")
 
     print()
 
-    # セシボン江戸川のメールを探す
+    # セシボン江戸川のメールを探す（取得済みのsnippetを再利用）
     target_message_id = None
     for msg in messages:
-        message = gmail.users().messages().get(userId='me', id=msg['id']).execute()
-        snippet = message.get('snippet', '')
+        snippet = snippets[msg['id']]
 
         if 'セシボン江戸川' in snippet or '1385983102' in snippet:
             target_message_id = msg['id']
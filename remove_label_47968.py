@@ -1,33 +1,9 @@
 #!/usr/bin/env python3
 """物件47968のメールからラベル削除"""
 
-from google.cloud import secretmanager
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from common import get_secret, gmail_service
 
-def get_secret(secret_name):
-    client = secretmanager.SecretManagerServiceClient()
-    project_id = "project-3255e657-b52f-4d63-ae7"
-    name = f"projects/{project_id}/secrets/{secret_name}/versions/latest"
-    response = client.access_secret_version(request={"name": name})
-    return response.payload.data.decode('UTF-8')
-
-def get_gmail_service():
-    client_id = get_secret("GMAIL_CLIENT_ID")
-    client_secret = get_secret("GMAIL_CLIENT_SECRET")
-    refresh_token = get_secret("GMAIL_REFRESH_TOKEN")
-
-    creds = Credentials(
-        token=None,
-        refresh_token=refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=client_id,
-        client_secret=client_secret,
-        scopes=["https://www.googleapis.com/auth/gmail.modify", "https://www.googleapis.com/auth/gmail.labels"]
-    )
-    return build('gmail', 'v1', credentials=creds)
-
-gmail = get_gmail_service()
+gmail = gmail_service()
 label_name = get_secret("PROCESSED_LABEL_NAME")
 
 # ラベルID取得
@@ -49,7 +25,10 @@ messages = results.get('messages', [])
 
 target_message_id = None
 for msg in messages:
-    message = gmail.users().messages().get(userId='me', id=msg['id']).execute()
+    # snippetだけ必要なのでminimal + fieldsで本文・添付を取得しない
+    message = gmail.users().messages().get(
+        userId='me', id=msg['id'], format='minimal', fields='snippet'
+    ).execute()
     snippet = message.get('snippet', '')
 
     if '47968' in snippet or '子安' in snippet:
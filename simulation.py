@@ -573,7 +573,7 @@ def create_simulation_excel(simulation_result, property_info, drive_service, fol
         media = MediaIoBaseUpload(
             buffer,
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            resumable=True
+            resumable=False  # 数十KB程度なのでシンプルアップロード（1往復）
         )
         file_metadata = {
             'name': filename,
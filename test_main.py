@@ -0,0 +1,325 @@
+"""
+main.py の補助関数のユニットテスト
+（main.pyはFlask・Google APIクライアント等に依存するため、未インストール環境ではスキップ）
+"""
+
+import sys
+import types
+import os
+sys.path.insert(0, os.path.dirname(__file__))
+
+import pytest
+
+main = pytest.importorskip("main")
+
+
+# ============================================================
+# Gmail API のテスト用フェイク（BatchHttpRequestのコールバック動作を再現）
+# ============================================================
+class FakeBatch:
+    def __init__(self, callback, responses):
+        self.callback = callback
+        self.responses = responses
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request, request_id))
+
+    def execute(self):
+        for request, request_id in self.requests:
+            response = self.responses[request]
+            if isinstance(response, Exception):
+                self.callback(request_id, None, response)
+            else:
+                self.callback(request_id, response, None)
+
+
+class FakeGmail:
+    """attachments().get(id=...) は id をそのままリクエストとして返す"""
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def attachments(self):
+        return self
+
+    def get(self, userId, messageId, id):
+        return id
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(callback, self.responses)
+
+
+def _attachment_part(filename, attachment_id):
+    return {'mimeType': 'application/pdf', 'filename': filename, 'body': {'attachmentId': attachment_id}}
+
+
+def test_batch_get_attachments_skips_failed_parts():
+    """取得に失敗した添付ファイルは結果に含まれない"""
+    gmail = FakeGmail({
+        'att1': {'data': 'aGVsbG8='},  # "hello"
+        'att2': Exception('boom'),
+    })
+    parts = [_attachment_part('a.pdf', 'att1'), _attachment_part('b.pdf', 'att2')]
+
+    fetched = main.batch_get_attachments(gmail, 'msg1', parts)
+
+    assert fetched == {'att1': b'hello'}
+
+
+def test_process_single_message_fails_when_attachment_fetch_fails(monkeypatch):
+    """添付ファイル取得に失敗したメールは失敗扱い（処理済みラベルを付けず次回再試行）"""
+    gmail = FakeGmail({
+        'att1': {'data': 'aGVsbG8='},
+        'att2': Exception('boom'),
+    })
+    uploads = []
+    monkeypatch.setattr(main, 'get_gmail_service', lambda: gmail)
+    monkeypatch.setattr(main, 'get_drive_service', lambda: None)
+    monkeypatch.setattr(main, 'get_or_create_folder', lambda *args: ('folder1', True))
+    monkeypatch.setattr(main, '_upload_attachment', lambda *args: uploads.append(args) or 'file1')
+
+    message = {
+        'internalDate': '0',
+        'payload': {'parts': [_attachment_part('a.pdf', 'att1'), _attachment_part('b.pdf', 'att2')]},
+    }
+    result = main._process_single_message(
+        {'id': 'msg1'}, message, 'label1', 'investment1',
+        lambda body, attachments: {'property_number': '123', 'station': '上中里'}
+    )
+
+    assert result is None, "添付ファイル取得失敗なのに処理済みになった"
+    assert uploads == [], "取得失敗時に一部の添付ファイルだけアップロードされた"
+
+
+# ============================================================
+# Gemini応答のJSONパース
+# ============================================================
+@pytest.mark.parametrize("response_text", [
+    '{"price": "1,000"}',
+    '```json\n{"price": "1,000"}\n```',
+    '```\n{"price": "1,000"}\n```',
+    '```json\n{"price": "1,000"}\n```\n以上です。',
+    '抽出結果です。\n```json\n{"price": "1,000"}\n```',
+])
+def test_parse_gemini_property_response_code_fence(response_text):
+    """コードブロックの有無・前後の説明文に関わらずJSONを取り出せる"""
+    assert main.parse_gemini_property_response(response_text) == {'price': 1000.0}
+
+
+# ============================================================
+# 数値文字列の変換
+# ============================================================
+@pytest.mark.parametrize("value, expected", [
+    ('1.2億', 120000000.0),
+    ('3,500万', 35000000.0),
+    ('1億2,000万円', 120000000.0),
+    ('6,100万円', 61000000.0),
+    ('８５，０００円', 85000.0),
+    ('４５．６㎡', 45.6),
+    ('-100', -100.0),
+    ('−5万', -50000.0),
+    ('－３００万円', -3000000.0),
+    ('', None),
+    ('-', None),
+    ('不明', None),
+    ('1-2', None),
+    (12345, 12345),
+    (None, None),
+])
+def test_to_num(value, expected):
+    """全角数字・万/億表記・負数の文字列を数値に変換できる"""
+    assert main._to_num(value) == expected
+
+
+# ============================================================
+# Docsテーブル挿入リクエストのインデックス計算
+# ============================================================
+def _utf16_units(text):
+    data = text.encode('utf-16-le')
+    return [data[i:i + 2] for i in range(0, len(data), 2)]
+
+
+def _apply_table_requests(content, requests):
+    """Docs APIのテーブル挿入をUTF-16コードユニット単位で再現する
+
+    テーブル・行・セルの開始はそれぞれ1ユニットのマーカー、空セルは改行1つで表す。
+    """
+    content = list(content)
+    for request in requests:
+        if 'deleteContentRange' in request:
+            rng = request['deleteContentRange']['range']
+            del content[rng['startIndex']:rng['endIndex']]
+        elif 'insertTable' in request:
+            table = request['insertTable']
+            units = ['\n', 'TABLE']
+            for _ in range(table['rows']):
+                units.append('ROW')
+                for _ in range(table['columns']):
+                    units += ['CELL', '\n']
+            index = table['location']['index']
+            content[index:index] = units
+        elif 'insertText' in request:
+            index = request['insertText']['location']['index']
+            content[index:index] = _utf16_units(request['insertText']['text'])
+    return content
+
+
+def _decode(units):
+    return b''.join(units).decode('utf-16-le')
+
+
+def _read_cells(content):
+    """再現したドキュメントからセルごとの文字列を行単位で取り出す"""
+    rows = []
+    cell = None
+    for unit in content[content.index('TABLE') + 1:]:
+        if unit == 'ROW':
+            rows.append([])
+        elif unit == 'CELL':
+            cell = []
+            rows[-1].append(cell)
+        elif unit == '\n':
+            cell = None
+        elif cell is not None:
+            cell.append(unit)
+    return [[_decode(cell) for cell in row] for row in rows]
+
+
+def test_build_table_requests_cell_indices():
+    """逆順のセル入力が正しいセルに入り、文字スタイル範囲がセル文字列と一致する（サロゲートペアを含む）"""
+    prefix = _utf16_units('前文\n')
+    placeholder = _utf16_units('{{TABLE}}\n')
+    content = prefix + placeholder + _utf16_units('後文\n')
+    start = len(prefix)
+    end = start + len(placeholder)
+    rows_data = [
+        ['項目', '値'],
+        ['🏠物件', '𠮷野家'],
+        ['利回り'],  # 列数より短い行は空セル
+    ]
+
+    requests, style_requests = main._build_table_requests(start, end, rows_data, 2)
+    content = _apply_table_requests(content, requests)
+
+    assert _read_cells(content) == [
+        ['項目', '値'],
+        ['🏠物件', '𠮷野家'],
+        ['利回り', ''],
+    ], "セルへの入力位置がずれている"
+
+    text_ranges = [
+        request['updateTextStyle']['range'] for request in style_requests
+        if 'updateTextStyle' in request
+    ]
+    styled = [_decode(content[rng['startIndex']:rng['endIndex']]) for rng in text_ranges]
+    assert styled == ['項目', '値', '🏠物件', '𠮷野家', '利回り'], "文字スタイルの範囲がセル文字列とずれている"
+    assert _decode(content[:start]) == '前文\n' and _decode(content[-3:]) == '後文\n', "テーブル外の本文が変わった"
+
+
+# ============================================================
+# Gemini応答キャッシュのキー（システム指示の区別）
+# ============================================================
+class FakeGenerativeModel:
+    def __init__(self, model_name, system_instruction=None):
+        self.model_name = model_name
+        self.instruction = system_instruction
+
+    def generate_content(self, contents, **kwargs):
+        return types.SimpleNamespace(text=f"{self.instruction}: {contents}")
+
+
+@pytest.fixture
+def fake_genai(monkeypatch):
+    genai = types.ModuleType('google.generativeai')
+    genai.configure = lambda api_key: None
+    genai.GenerativeModel = FakeGenerativeModel
+    monkeypatch.setitem(sys.modules, 'google.generativeai', genai)
+    monkeypatch.setattr(sys.modules['google'], 'generativeai', genai, raising=False)
+    monkeypatch.setattr(main, '_read_secret', lambda name: 'dummy')
+    monkeypatch.setattr(main, '_llm_cache', {})
+    main.get_gemini_client.cache_clear()
+    yield
+    main.get_gemini_client.cache_clear()
+
+
+def test_generate_content_cached_separates_system_instructions(fake_genai):
+    """システム指示の異なるモデルは同じ入力でも応答キャッシュを共有しない"""
+    plain = main.get_gemini_client()
+    prompt_a = main.get_gemini_client('指示A')
+    prompt_b = main.get_gemini_client('指示B')
+
+    assert main._generate_content_cached(prompt_a, '本文') == '指示A: 本文'
+    assert main._generate_content_cached(prompt_b, '本文') == '指示B: 本文'
+    assert main._generate_content_cached(plain, '本文') == 'None: 本文'
+    assert main._generate_content_cached(prompt_a, '本文') == '指示A: 本文', "別の指示の応答が返った"
+
+
+def test_generate_content_cached_rejects_unknown_model(fake_genai):
+    """get_gemini_client 以外で作ったモデルは指示が分からないためキャッシュに使わない"""
+    with pytest.raises(ValueError):
+        main._generate_content_cached(FakeGenerativeModel('gemini-2.5-flash', '指示A'), '本文')
+
+
+# ============================================================
+# 処理済みラベルの付与
+# ============================================================
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class FakeLabelGmail:
+    """messages().list / batchModify / modify を記録するフェイク（batchModifyは常に失敗）"""
+
+    def __init__(self, message_ids, failing_ids=()):
+        self.message_ids = message_ids
+        self.failing_ids = set(failing_ids)
+        self.modified = []
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def list(self, **kwargs):
+        return FakeRequest({'messages': [{'id': message_id} for message_id in self.message_ids]})
+
+    def batchModify(self, userId, body):
+        return FakeRequest(Exception('batchModify failed'))
+
+    def modify(self, userId, id, body):
+        if id in self.failing_ids:
+            return FakeRequest(Exception('modify failed'))
+        self.modified.append(id)
+        return FakeRequest({})
+
+
+def test_process_email_type_keeps_results_when_batch_modify_fails(monkeypatch):
+    """一括ラベル付与に失敗してもメール毎に付与し、処理結果を返す"""
+    gmail = FakeLabelGmail(['msg1', 'msg2', 'msg3'], failing_ids=['msg2'])
+    monkeypatch.setattr(
+        main, 'batch_get_messages',
+        lambda gmail, messages, **kwargs: {msg['id']: {'id': msg['id']} for msg in messages}
+    )
+    monkeypatch.setattr(
+        main, '_process_single_message',
+        lambda msg, message, *args: f"Processed: {msg['id']}"
+    )
+
+    results = main.process_email_type(gmail, 'subject:販売図面', 'label1', 'investment1', None)
+
+    assert results == ['Processed: msg1', 'Processed: msg2', 'Processed: msg3'], "処理結果が失われた"
+    assert gmail.modified == ['msg1', 'msg3'], "個別のラベル付与に切り替わっていない"